@@ -0,0 +1,68 @@
+import argparse
+import gc
+import tracemalloc
+
+from simulator.components import ic74, memory
+from simulator.points import *
+
+################################################################################
+
+# Memory footprint of the points of large designs, compared with the layout
+# points had before: a __dict__ per point, a direction string, and a name
+# concatenated with the names of all its parents when the point is built.
+
+class LegacyPoint:
+    def __init__(self, name, value, direction, width):
+        self.name = name
+        self.value = value
+        self.direction = direction
+        self.width = width
+
+def compact(point):
+    clone = type(point).__new__(type(point))
+    clone.name = Name(point._parent, point._local_name) if point._parent else point._local_name
+    clone.value = list(point.value)
+    clone.direction = point.direction
+    if isinstance(point, WidePoint):
+        clone.width = point.width
+    return clone
+
+def legacy(point):
+    # Strings built at run time, as the concatenated names used to be
+    name = ''.join([ point.name ])
+    direction = ''.join([ DIRECTIONS[point.direction] ])
+    return LegacyPoint(name, list(point.value), direction, len(point.value))
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return result, size
+
+def designs(scale):
+    return [
+        ('Decoder_139({})'.format(scale), lambda: [ ic74.Decoder_139(scale) ]),
+        ('{} x ROM_28C256(8, 8)'.format(2**scale // 4), lambda: [ memory.ROM_28C256(8, 8) for n in range(2**scale // 4) ]),
+        ('{} x Register_173(8)'.format(2**scale), lambda: [ ic74.Register_173(8) for n in range(2**scale) ]),
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description='Memory footprint of points')
+    parser.add_argument('--scale', type=int, default=12)
+    args = parser.parse_args()
+
+    print('{:<28} {:>8} {:>12} {:>12} {:>8}'.format('design', 'points', 'bytes/point', 'legacy', 'saved'))
+    for name, build in designs(args.scale):
+        points = [ p for c in build() for p in c.points() ]
+        _, size = measure(lambda: [ compact(p) for p in points ])
+        _, legacy_size = measure(lambda: [ legacy(p) for p in points ])
+        print('{:<28} {:>8} {:>12.1f} {:>12.1f} {:>7.0%}'.format(
+            name, len(points), size / len(points), legacy_size / len(points), 1 - size / legacy_size))
+
+################################################################################
+
+if __name__ == "__main__":
+    main()
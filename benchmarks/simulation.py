@@ -0,0 +1,253 @@
+import argparse
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from simulator.circuit import Circuit, SWEEP, EVENT, LEVELIZED
+from simulator.components import example, ic74, memory
+from simulator.points import *
+
+################################################################################
+
+# Simulation speed of parametric designs built from the existing parts, as
+# they scale: build time, steps per second, iterations per step, and peak
+# memory. Results go to JSON, and can be checked against a baseline from an
+# earlier run to catch regressions.
+
+# Every design builder returns the circuit, a setup function run once before
+# measuring, and a stimulus function run before every measured step.
+
+def ripple_adder(n):
+    a = [ Point('a{}'.format(i)) for i in range(n) ]
+    b = [ Point('b{}'.format(i)) for i in range(n) ]
+    cin = Point('cin')
+    circuit = Circuit('adder')
+    carry = cin
+    for i in range(n):
+        fa = example.FullAdder('fa{}'.format(i))
+        circuit.add(fa).connect(a[i], fa.a).connect(b[i], fa.b).connect(carry, fa.cin)
+        carry = fa.cout
+    rng = random.Random(n)
+
+    def setup():
+        cin.OUT(value_low())
+
+    def stimulus(k):
+        x = rng.getrandbits(n)
+        y = rng.getrandbits(n)
+        for i in range(n):
+            a[i].OUT(value((x >> i) & 1))
+            b[i].OUT(value((y >> i) & 1))
+
+    return circuit, setup, stimulus
+
+def counter_chain(n):
+    clock = SignalPoint('clock')
+    n_reset = SignalPoint('/reset')
+    high = SignalPoint('high')
+    circuit = Circuit('counters')
+    carry = high
+    for i in range(n):
+        counter = ic74.Counter_161(4, 'counter{}'.format(i))
+        (circuit.add(counter)
+            .connect(clock, counter.clock).connect(n_reset, counter.n_reset)
+            .connect(high, counter.n_ie).connect(high, counter.cep).connect(carry, counter.cet)
+        )
+        carry = counter.tc
+
+    def setup():
+        clock.OUT(value_low())
+        n_reset.OUT(value_low())
+        high.OUT(value_high())
+        circuit.step()
+        n_reset.OUT(value_high())
+
+    def stimulus(k):
+        clock.OUT(value(k % 2))
+
+    return circuit, setup, stimulus
+
+def register_bank(n):
+    data = WidePoint('data', 8)
+    clock = SignalPoint('clock')
+    reset = SignalPoint('reset')
+    low = SignalPoint('low')
+    buffer = ic74.Buffer_541(8, 'buffer')
+    circuit = Circuit('registers').add(buffer).connect(data, buffer.input).connect(low, buffer.n_oe)
+    for i in range(n):
+        register = ic74.Register_173(8, 'register{}'.format(i))
+        (circuit.add(register)
+            .connect(buffer.output, register.input).connect(clock, register.clock)
+            .connect(reset, register.reset).connect(low, register.n_ie).connect(low, register.n_oe)
+        )
+
+    def setup():
+        data.OUT(int_to_packed(0, 8))
+        clock.OUT(value_low())
+        reset.OUT(value_high())
+        low.OUT(value_low())
+        circuit.step()
+        reset.OUT(value_low())
+
+    def stimulus(k):
+        if k % 2 == 0:
+            data.OUT(int_to_packed(k // 2, 8))
+        clock.OUT(value(k % 2))
+
+    return circuit, setup, stimulus
+
+def decoder(n):
+    address = WidePoint('address', n)
+    n_ie = SignalPoint('/ie')
+    dec = ic74.Decoder_139(n, 'decoder')
+    circuit = Circuit('decoder').add(dec).connect(address, dec.input).connect(n_ie, dec.n_ie)
+
+    def setup():
+        # Disabled until the address settled
+        address.OUT(int_to_packed(0, n))
+        n_ie.OUT(value_high())
+        circuit.step()
+        n_ie.OUT(value_low())
+
+    def stimulus(k):
+        address.OUT(int_to_packed(k, n))
+
+    return circuit, setup, stimulus
+
+def rom(n):
+    address = WidePoint('address', n)
+    n_oe = SignalPoint('/oe')
+    low = SignalPoint('low')
+    chip = memory.ROM_28C256(8, n, 'rom')
+    chip.set_content([ k % 256 for k in range(2**n) ])
+    circuit = Circuit('rom').add(chip).connect(address, chip.address).connect(n_oe, chip.n_oe).connect(low, chip.n_ce)
+
+    def setup():
+        # Disabled until the address settled, the chip reading its own pins
+        # before they are propagated
+        chip.n_oe.set(value_high())
+        address.OUT(int_to_packed(0, n))
+        n_oe.OUT(value_high())
+        low.OUT(value_low())
+        circuit.step()
+        n_oe.OUT(value_low())
+
+    def stimulus(k):
+        address.OUT(int_to_packed(k * 7919, n))
+
+    return circuit, setup, stimulus
+
+DESIGNS = {
+    'ripple_adder': (ripple_adder, [ 8, 32, 128 ]),
+    'counter_chain': (counter_chain, [ 4, 16, 64 ]),
+    'register_bank': (register_bank, [ 4, 16, 64 ]),
+    'decoder': (decoder, [ 4, 8, 10 ]),
+    'rom': (rom, [ 8, 12, 15 ]),
+}
+
+################################################################################
+
+def measure(build, n, engine, steps, limit):
+    gc.collect()
+    start = time.perf_counter()
+    circuit, setup, stimulus = build(n)
+    circuit.netlist()
+    build_time = time.perf_counter() - start
+
+    setup()
+    circuit.step(engine=engine, limit=limit)
+    iterations = 0
+    settled = True
+    start = time.perf_counter()
+    for k in range(steps):
+        stimulus(k)
+        ok, count = circuit.step(engine=engine, limit=limit)
+        settled = settled and ok
+        iterations += count + 1
+    elapsed = time.perf_counter() - start
+
+    # Memory is traced apart, tracing slows everything down
+    gc.collect()
+    tracemalloc.start()
+    circuit, setup, stimulus = build(n)
+    setup()
+    for k in range(min(steps, 10)):
+        stimulus(k)
+        circuit.step(engine=engine, limit=limit)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        'design': build.__name__,
+        'n': n,
+        'engine': engine,
+        'points': sum(len(list(c.points())) for c in circuit.netlist().components),
+        'settled': settled,
+        'build_time': build_time,
+        'steps_per_second': steps / elapsed,
+        'iterations_per_step': iterations / steps,
+        'peak_memory': peak,
+    }
+
+def key(result):
+    return '{}[{}]/{}'.format(result['design'], result['n'], result['engine'])
+
+# Results slower than the baseline by more than tolerance, as (key, ratio)
+def compare(results, baseline, tolerance):
+    previous = { key(r): r for r in baseline['results'] }
+    regressions = []
+    for result in results:
+        old = previous.get(key(result))
+        if old is None:
+            continue
+        ratio = result['steps_per_second'] / old['steps_per_second']
+        if ratio < 1 - tolerance:
+            regressions.append((key(result), ratio))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulation speed of scalable designs')
+    parser.add_argument('--designs', nargs='*', default=list(DESIGNS), choices=list(DESIGNS))
+    parser.add_argument('--sizes', nargs='*', type=int, help='sizes to run, instead of the defaults of each design')
+    parser.add_argument('--engines', nargs='*', default=[ SWEEP, EVENT ], choices=[ SWEEP, EVENT, LEVELIZED ])
+    parser.add_argument('--steps', type=int, default=200)
+    parser.add_argument('--limit', type=int, default=1000, help='iterations allowed per step, long ripples need many')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='slowdown accepted before reporting a regression')
+    args = parser.parse_args()
+
+    results = []
+    print('{:<24} {:>6} {:>10} {:>8} {:>10} {:>12} {:>10} {:>12}'.format(
+        'design', 'n', 'engine', 'points', 'build s', 'steps/s', 'iter/step', 'peak KiB'))
+    for name in args.designs:
+        build, sizes = DESIGNS[name]
+        for n in args.sizes or sizes:
+            for engine in args.engines:
+                result = measure(build, n, engine, args.steps, args.limit)
+                results.append(result)
+                print('{:<24} {:>6} {:>10} {:>8} {:>10.3f} {:>12.1f} {:>10.2f} {:>12.0f}{}'.format(
+                    name, n, engine, result['points'], result['build_time'], result['steps_per_second'],
+                    result['iterations_per_step'], result['peak_memory'] / 1024,
+                    '' if result['settled'] else '  (not settled)'))
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({ 'python': sys.version, 'steps': args.steps, 'results': results }, file, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.tolerance)
+        for name, ratio in regressions:
+            print('REGRESSION {}: {:.0%} of the baseline speed'.format(name, ratio))
+        if len(regressions) > 0:
+            sys.exit(1)
+
+################################################################################
+
+if __name__ == "__main__":
+    main()
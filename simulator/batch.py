@@ -0,0 +1,292 @@
+import functools
+
+import numpy as np
+
+from .components import boolean, components, ic74, memory
+from .points import IN, OUT, TriggerPoint
+from .value import *
+
+################################################################################
+
+# Batch simulation: every point holds a (batch, width) array of symbol codes,
+# one row per independent copy of the circuit, and every component evaluates
+# all the rows at once.
+
+SYMBOLS = (LOW, HIGH, FLOATING, HI_Z, CONFLICT, UNDECIDED)
+CODES = { symbol: code for code, symbol in enumerate(SYMBOLS) }
+C_LOW, C_HIGH, C_FLOATING, C_HI_Z, C_CONFLICT, C_UNDECIDED = range(len(SYMBOLS))
+
+def to_codes(value):
+    return np.array([ CODES[x] for x in value ], dtype=np.int8)
+
+def from_codes(codes):
+    return value(*( SYMBOLS[x] for x in codes ))
+
+def is_binary(codes):
+    return (codes <= C_HIGH).all(axis=1)
+
+def codes_to_int(codes):
+    width = codes.shape[1]
+    weights = 1 << np.arange(width - 1, -1, -1, dtype=np.int64)
+    return np.where(is_binary(codes), codes.astype(np.int64) @ weights, -1)
+
+def int_to_codes(n, width):
+    n = np.asarray(n, dtype=np.int64) % 2**width
+    shifts = np.arange(width - 1, -1, -1, dtype=np.int64)
+    return ((n[:, None] >> shifts) & 1).astype(np.int8)
+
+def exhaustive(*widths):
+    total = sum(widths)
+    n = np.arange(2**total, dtype=np.int64)
+    columns = []
+    for width in widths:
+        total -= width
+        columns.append((n >> total) % 2**width)
+    return columns
+
+################################################################################
+
+EVALUATORS = {}
+
+def evaluator(*classes):
+    def register(function):
+        for cls in classes:
+            EVALUATORS[cls] = function
+        return function
+    return register
+
+def find_evaluator(component):
+    for cls in type(component).__mro__:
+        if cls in EVALUATORS:
+            return EVALUATORS[cls]
+    raise TypeError('{}: no batch evaluator for {}'.format(component.name, type(component).__name__))
+
+################################################################################
+
+class Batch:
+    def __init__(self, circuit, size, *, netlist=None):
+        self.size = size
+        self.netlist = circuit.netlist() if netlist is None else netlist
+        self.values = {}
+        self.drives = {}
+        self._inputs = set()
+        self._was_low = {}
+        self._changed = False
+        self._contents = {}
+        self._evaluators = [ (c, find_evaluator(c)) for c in self.netlist.active ]
+        for point in self.netlist.points:
+            self._add(point)
+        for c in self.netlist.active:
+            for point in c.points():
+                self._add(point)
+
+    def _add(self, point):
+        if point in self.values:
+            return
+        self.values[point] = np.tile(to_codes(point.value), (self.size, 1))
+        self.drives[point] = np.full(self.size, point.direction == OUT)
+        if point.direction == IN:
+            self._inputs.add(point)
+        if isinstance(point, TriggerPoint):
+            self._was_low[point] = np.full(self.size, point._was_low)
+
+    # Stimulus, equivalent to point.OUT(value) on every row
+    def set(self, point, values):
+        self._add(point)
+        values = np.asarray(values)
+        if values.ndim == 1:
+            values = int_to_codes(values, self.values[point].shape[1])
+        self.values[point] = np.broadcast_to(values, self.values[point].shape).astype(np.int8)
+        self.drives[point] = np.ones(self.size, dtype=bool)
+        self._inputs.discard(point)
+        return self
+
+    def get(self, point):
+        return self.values[point]
+
+    def get_int(self, point):
+        return codes_to_int(self.values[point])
+
+    ############################################################################
+    # Helpers for the evaluators
+
+    def read(self, point):
+        return self.values[point]
+
+    def high(self, point):
+        return self.values[point][:, 0] == C_HIGH
+
+    def low(self, point):
+        return self.values[point][:, 0] == C_LOW
+
+    def triggered(self, point):
+        return self._was_low[point] & self.high(point)
+
+    def tick(self, point):
+        self._was_low[point] = self.low(point)
+
+    def write(self, point, values, drives=True, rows=None):
+        old_values = self.values[point]
+        old_drives = self.drives[point]
+        values = np.broadcast_to(values, old_values.shape)
+        drives = np.broadcast_to(drives, old_drives.shape)
+        if rows is not None:
+            values = np.where(rows[:, None], values, old_values)
+            drives = np.where(rows, drives, old_drives)
+        if not (np.array_equal(values, old_values) and np.array_equal(drives, old_drives)):
+            self.values[point] = np.array(values, dtype=np.int8)
+            self.drives[point] = np.array(drives, dtype=bool)
+            self._changed = True
+
+    def hi_z(self, point, rows=None):
+        self.write(point, C_HI_Z, False, rows)
+
+    # Words of a memory as an array, converted again only when replaced
+    def content(self, component):
+        content = component._content
+        cached = self._contents.get(component)
+        if cached is None or cached[0] is not content:
+            cached = self._contents[component] = (content, np.asarray(content, dtype=np.int64))
+        return cached[1]
+
+    ############################################################################
+
+    def generation(self):
+        for component, evaluate in self._evaluators:
+            evaluate(self, component)
+
+    def propagation(self):
+        for net in self.netlist.nets:
+            drivers = [ p for p in net if p not in self._inputs ]
+            readers = [ p for p in net if p in self._inputs ]
+            if len(readers) == 0:
+                continue
+            width = self.values[readers[0]].shape[1]
+            count = np.zeros(self.size, dtype=np.int64)
+            result = np.full((self.size, width), C_FLOATING, dtype=np.int8)
+            for p in drivers:
+                drives = self.drives[p]
+                count += drives
+                result = np.where(drives[:, None], self.values[p], result)
+            result[count > 1] = C_CONFLICT
+            for p in readers:
+                if not np.array_equal(self.values[p], result):
+                    self.values[p] = result
+                    self._changed = True
+
+    def iteration(self):
+        self._changed = False
+        self.generation()
+        self.propagation()
+        return not self._changed
+
+    def step(self, *, limit=100):
+        n = 0
+        while not self.iteration() and n < limit:
+            n += 1
+        return (n < limit, n)
+
+################################################################################
+
+@functools.lru_cache(maxsize=None)
+def gate_tables(cls):
+    # The flat tables of the gate class, as code arrays
+    table = np.array([ CODES[x] for x in cls.TABLE ], dtype=np.int8).reshape(len(SYMBOLS), len(SYMBOLS))
+    final = np.array([ CODES[x] for x in cls.FINAL ], dtype=np.int8)
+    return table, final
+
+@evaluator(boolean.Boolean)
+def evaluate_boolean(batch, component):
+    table, final = gate_tables(type(component))
+    out = batch.read(component.inputs[0])
+    for p in component.inputs[1:]:
+        out = table[out, batch.read(p)]
+    batch.write(component.output, final[out])
+
+@evaluator(ic74.Buffer_541)
+def evaluate_buffer_541(batch, component):
+    enabled = batch.low(component.n_oe)
+    output = np.where(enabled[:, None], batch.read(component.input), C_HI_Z)
+    batch.write(component.output, output, enabled)
+
+@evaluator(ic74.Register_173)
+def evaluate_register_173(batch, component):
+    enabled = batch.low(component.n_oe)
+    reset = enabled & batch.high(component.reset)
+    load = enabled & ~reset & batch.low(component.n_ie) & batch.triggered(component.clock)
+    batch.hi_z(component.output, ~enabled)
+    batch.write(component.output, C_LOW, True, reset)
+    batch.write(component.output, batch.read(component.input), True, load)
+    batch.tick(component.clock)
+
+def _all(codes, code):
+    return (codes == code).all(axis=1)
+
+def _count(codes, step, width):
+    n = codes_to_int(codes)
+    return np.where((n >= 0)[:, None], int_to_codes(n + step, width), C_UNDECIDED)
+
+@evaluator(ic74.Counter_161)
+def evaluate_counter_161(batch, component):
+    width = component.width
+    reset = batch.low(component.n_reset)
+    triggered = ~reset & batch.triggered(component.clock)
+    load = triggered & batch.low(component.n_ie)
+    count = triggered & ~batch.low(component.n_ie) & batch.high(component.cep) & batch.high(component.cet)
+    output = batch.read(component.output)
+    output = np.where(reset[:, None], C_LOW, output)
+    output = np.where(load[:, None], batch.read(component.input), output)
+    output = np.where(count[:, None], _count(output, 1, width), output)
+    batch.write(component.output, output)
+    carry = ~reset & _all(output, C_HIGH)
+    batch.write(component.tc, np.where(carry[:, None], batch.read(component.cet), C_LOW))
+    batch.tick(component.clock)
+
+@evaluator(ic74.Counter_193)
+def evaluate_counter_193(batch, component):
+    width = component.width
+    reset = batch.high(component.reset)
+    load = ~reset & batch.low(component.n_ie)
+    counting = ~reset & ~load
+    up = counting & batch.triggered(component.cpu) & batch.high(component.cpd)
+    down = counting & ~up & batch.high(component.cpu) & batch.triggered(component.cpd)
+    hold = counting & ~up & ~down
+    output = batch.read(component.output)
+    output = np.where(reset[:, None], C_LOW, output)
+    output = np.where(load[:, None], batch.read(component.input), output)
+    output = np.where(up[:, None], _count(output, 1, width), output)
+    output = np.where(down[:, None], _count(output, -1, width), output)
+    batch.write(component.output, output)
+    cpu = batch.read(component.cpu)
+    cpd = batch.read(component.cpd)
+    terminal = load | hold
+    n_tcu = np.where((terminal & _all(output, C_HIGH))[:, None], cpu, C_HIGH)
+    n_tcd = np.where((terminal & _all(output, C_LOW))[:, None], cpd, C_HIGH)
+    n_tcd = np.where(reset[:, None], cpd, n_tcd)
+    batch.write(component.n_tcu, n_tcu)
+    batch.write(component.n_tcd, n_tcd)
+    batch.tick(component.cpu)
+    batch.tick(component.cpd)
+
+@evaluator(ic74.Decoder_139)
+def evaluate_decoder_139(batch, component):
+    n = codes_to_int(batch.read(component.input))
+    enabled = batch.low(component.n_ie)
+    rows = np.arange(batch.size)
+    outputs = np.full((batch.size, len(component.outputs)), C_HIGH, dtype=np.int8)
+    decoded = enabled & (n >= 0)
+    outputs[rows[decoded], n[decoded]] = C_LOW
+    outputs[enabled & (n < 0)] = C_UNDECIDED
+    for k, output in enumerate(component.outputs):
+        batch.write(output, outputs[:, k:k + 1])
+
+@evaluator(memory.ROM_28C256, components.ROM_28C256)
+def evaluate_rom_28c256(batch, component):
+    # Disabled by a high control only, floating ones enable as in generate()
+    enabled = ~(batch.high(component.n_ce) | batch.high(component.n_oe))
+    address = codes_to_int(batch.read(component.address))
+    content = batch.content(component)
+    data = int_to_codes(content[np.maximum(address, 0)], component.width)
+    data = np.where((address >= 0)[:, None], data, C_UNDECIDED)
+    batch.hi_z(component.data, ~enabled)
+    batch.write(component.data, data, True, enabled)
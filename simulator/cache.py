@@ -0,0 +1,198 @@
+import hashlib
+import importlib.util
+import marshal
+import os
+import pickle
+import sys
+import tempfile
+
+from .design import class_path
+from . import levelize
+from .levelize import Program
+
+################################################################################
+
+# On-disk cache of compiled simulation artifacts, shared between processes
+# simulating the same designs: levelized programs with their compiled code.
+# Netlists are not cached, hashing the structure costs as much as building
+# them.
+#
+# Entries are keyed by a structural hash of the circuit: the classes of its
+# components and points, which ones are memoized, the widths of the points,
+# and the connections of every wiring, over a canonical numbering of the
+# components and points. Artifacts refer to components and points by their
+# canonical number. The hash also covers the source files of every class
+# involved and of the simulator itself, and the Python version, so that
+# changed code never reuses stale artifacts.
+#
+# Entries are files written atomically, and the least recently used ones are
+# removed once the cache grows over max_bytes.
+#
+# Entries are pickles holding code that gets run: the directory must be
+# trusted, writable by no one else than the users of the cache. It is created
+# private to its owner.
+
+VERSION = b'artifacts 1'
+
+_sources = {}
+
+def source_hash(path):
+    # Files are only hashed again when they change on disk
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    if key not in _sources:
+        with open(path, 'rb') as file:
+            _sources[key] = hashlib.sha256(file.read()).digest()
+    return _sources[key]
+
+def module_files(classes):
+    files = set()
+    for cls in classes:
+        for base in cls.__mro__:
+            module = sys.modules.get(base.__module__)
+            if getattr(module, '__file__', None) is not None:
+                files.add(module.__file__)
+    package = os.path.dirname(__file__)
+    for name in sorted(os.listdir(package)):
+        if name.endswith('.py'):
+            files.add(os.path.join(package, name))
+    return sorted(files)
+
+# Structural hash of a circuit, with its components and points in canonical
+# order
+class Fingerprint:
+    def __init__(self, circuit):
+        self.components = list(circuit.components())
+        points = {}
+        for c in self.components:
+            for p in c.points():
+                points.setdefault(p, len(points))
+        # Points only in wirings, in the order they were first connected
+        for c in self.components:
+            for p in c.wiring.connections:
+                points.setdefault(p, len(points))
+        self.points = list(points)
+
+        digest = hashlib.sha256(VERSION)
+        digest.update(importlib.util.MAGIC_NUMBER)
+        classes = { type(x) for x in self.components } | { type(p) for p in self.points }
+        for path in module_files(classes):
+            digest.update(source_hash(path))
+        for c in self.components:
+            digest.update(class_path(type(c)).encode())
+            digest.update(b'memoized' if c.memo is not None else b'-')
+            digest.update(repr([ points[p] for p in c.points() ]).encode())
+        for p in self.points:
+            digest.update('{}/{};'.format(class_path(type(p)), len(p.value)).encode())
+        for c in self.components:
+            for p, connections in c.wiring.connections.items():
+                digest.update(repr((points[p], sorted(points[q] for q in connections))).encode())
+        self.hash = digest.hexdigest()
+        self.index = points
+
+    # Hash of the directions and widths of the points, which levelized code
+    # is specialized for, and of the version of the generator
+    def state_hash(self):
+        digest = hashlib.sha256(self.hash.encode())
+        digest.update('levelize {};'.format(levelize.VERSION).encode())
+        digest.update(bytes( 255 if p.direction is None else p.direction for p in self.points ))
+        digest.update(repr([ len(p.value) for p in self.points ]).encode())
+        return digest.hexdigest()
+
+################################################################################
+
+class ArtifactCache:
+    def __init__(self, directory, max_bytes=256 * 2**20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    def _path(self, key, kind):
+        return os.path.join(self.directory, '{}.{}'.format(key, kind))
+
+    def get(self, key, kind):
+        path = self._path(key, kind)
+        try:
+            with open(path, 'rb') as file:
+                entry = pickle.load(file)
+            # Recently used entries are the last evicted
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception:
+            # Truncated or unreadable, as good as missing
+            self._remove(path)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, key, kind, entry):
+        file, temporary = tempfile.mkstemp(dir=self.directory, prefix='.')
+        try:
+            with os.fdopen(file, 'wb') as file:
+                pickle.dump(entry, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary, self._path(key, kind))
+        except BaseException:
+            self._remove(temporary)
+            raise
+        self.evict()
+
+    def evict(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.startswith('.'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                total += stat.st_size
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.is_file():
+                self._remove(entry.path)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    ############################################################################
+
+    # Levelized program, None when the netlist cannot be levelized, or False
+    # when not cached
+    def program(self, fingerprint):
+        entry = self.get(fingerprint.state_hash(), 'levelized')
+        if entry is None:
+            return False
+        if entry == ():
+            return None
+        source, code, points, gates, guarded = entry
+        p = fingerprint.points
+        c = fingerprint.components
+        return Program(source, [ p[i] for i in points ], [ c[i] for i in gates ], [ p[i] for i in guarded ],
+            marshal.loads(code))
+
+    def put_program(self, fingerprint, program):
+        if program is None:
+            entry = ()
+        else:
+            points = fingerprint.index
+            components = { c: i for i, c in enumerate(fingerprint.components) }
+            entry = (
+                program.source, marshal.dumps(program.code),
+                [ points[p] for p in program.points ],
+                [ components[g] for g in program.gates ],
+                [ points[p] for p in program.guarded ],
+            )
+        self.put(fingerprint.state_hash(), 'levelized', entry)
@@ -0,0 +1,102 @@
+from .components.components import Component, collect_points
+from .points import TriggerPoint
+from .value import *
+
+################################################################################
+
+# Snapshots of the whole simulation state in one bytes buffer. Every point,
+# in the order of the layout of the netlist, takes:
+#   - a flags byte: direction in bits 0-1, TriggerPoint._was_low in bit 2,
+#   - its width on 2 bytes, little endian,
+#   - one symbol code per bit.
+# Then every component overriding save_state() takes 4 bytes of length, and
+# the bytes it saved.
+
+SYMBOLS = (LOW, HIGH, FLOATING, HI_Z, CONFLICT, UNDECIDED)
+CODES = { symbol: code for code, symbol in enumerate(SYMBOLS) }
+WAS_LOW = 4
+# Entries kept by the encode and decode caches of a layout, which start over
+# once full
+CACHE_SIZE = 4096
+
+class Layout:
+    def __init__(self, circuit, netlist):
+        self.points = list(dict.fromkeys(collect_points([ circuit ]) + netlist.points))
+        self.triggers = { p for p in self.points if isinstance(p, TriggerPoint) }
+        self.components = [ c for c in netlist.components if type(c).save_state is not Component.save_state ]
+        # Encoded values and decoded codes, shared between points and snapshots
+        self._encoded = {}
+        self._decoded = {}
+
+    def encode(self, value):
+        key = value if isinstance(value, Packed) else tuple(value)
+        encoded = self._encoded.get(key)
+        if encoded is None:
+            width = len(value)
+            encoded = bytes([ width & 0xFF, width >> 8 ]) + bytes( CODES[x] for x in value )
+            if len(self._encoded) >= CACHE_SIZE:
+                self._encoded.clear()
+            self._encoded[key] = encoded
+        return encoded
+
+    def decode(self, codes):
+        value = self._decoded.get(codes)
+        if value is None:
+            value = pack([ SYMBOLS[x] for x in codes ])
+            if len(self._decoded) >= CACHE_SIZE:
+                self._decoded.clear()
+            self._decoded[codes] = value
+        return value
+
+class Checkpoint:
+    __slots__ = ('layout', 'buffer')
+
+    def __init__(self, layout, buffer):
+        self.layout = layout
+        self.buffer = buffer
+
+    def __len__(self):
+        return len(self.buffer)
+
+################################################################################
+
+def save(layout):
+    parts = []
+    triggers = layout.triggers
+    encode = layout.encode
+    for p in layout.points:
+        flags = p.direction
+        if p in triggers and p._was_low:
+            flags |= WAS_LOW
+        parts.append(bytes([ flags ]))
+        parts.append(encode(p.value))
+    for c in layout.components:
+        state = bytes(c.save_state())
+        parts.append(len(state).to_bytes(4, 'little'))
+        parts.append(state)
+    return Checkpoint(layout, b''.join(parts))
+
+def load(checkpoint):
+    layout = checkpoint.layout
+    buffer = checkpoint.buffer
+    triggers = layout.triggers
+    decode = layout.decode
+    i = 0
+    for p in layout.points:
+        flags = buffer[i]
+        width = buffer[i + 1] | (buffer[i + 2] << 8)
+        value = decode(buffer[i + 3:i + 3 + width])
+        i += 3 + width
+        direction = flags & 3
+        # Stamped as any other change, for the event engine and the tracers
+        if direction != p.direction or value != p.value:
+            p._changing()
+            p.direction = direction
+            p.value = value
+        if p in triggers:
+            p._was_low = bool(flags & WAS_LOW)
+    for c in layout.components:
+        size = int.from_bytes(buffer[i:i + 4], 'little')
+        c.load_state(buffer[i + 4:i + 4 + size])
+        i += 4 + size
+    assert i == len(buffer)
@@ -1,8 +1,18 @@
+from array import array
+
+from . import checkpoint
 from .components.components import Component
-from .wiring import Wiring
-from .points import OUT
+from .cache import Fingerprint
+from .levelize import levelize
+from .memo import Memo
+from .netlist import Netlist
+from .points import OUT, Journal, tracking
 from .value import *
 
+SWEEP = 'sweep'
+EVENT = 'event'
+LEVELIZED = 'levelized'
+
 ################################################################################################
 
 def signature(points):
@@ -12,47 +22,160 @@ def generation(components):
     for component in components:
         component.generate()
 
-def propagation(wiring):
-    points = wiring.points()
-    while len(points) > 0:
-        point = points.pop()
-        neighbours = { point }
-        neighbours |= wiring.neighbours(point)
-        points -= neighbours
-        drivers = [ p for p in neighbours if p.direction == OUT ]
-        if len(drivers) == 0:
-            for p in neighbours:
-                p.set(value_floating())
-        elif len(drivers) == 1:
-            driver = drivers[0]
-            value = driver.get()
-            for p in neighbours:
-                if p != driver:
-                    p.set(value)
-        else:
-            for p in neighbours:
-                p.set(value_conflict())
-        # print(neighbours, drivers)
-
-def iteration(component):
-    wiring = Wiring()
-    for w in component.wirings():
-        for point, connections in w.connections.items():
-            wiring.connections[point] |= connections
-    
-    points = wiring.points()
-    before = signature(points)
-    generation(component.components())
-    propagation(wiring)
-    after = signature(points)
-    return after == before
+# A net with some of its bits stuck, whatever drives it: the points reading
+# it see the forced symbols, by bit index, over the resolved value
+class Forced(tuple):
+    def __new__(cls, net, bits):
+        forced = super().__new__(cls, net)
+        forced.bits = bits
+        return forced
+
+    def __reduce__(self):
+        return (Forced, (tuple(self), self.bits))
+
+def resolve_forced(net):
+    drivers = [ p for p in net if p.direction == OUT ]
+    width = len(net[0].value)
+    if len(drivers) == 0:
+        value = value_floating(width)
+    elif len(drivers) == 1:
+        value = list(drivers[0].get())
+    else:
+        value = value_conflict(width)
+    for bit, symbol in net.bits.items():
+        value[bit] = symbol
+    for p in net:
+        if p.direction != OUT:
+            p.set(value)
+
+def resolve(net):
+    if type(net) is Forced:
+        return resolve_forced(net)
+    drivers = [ p for p in net if p.direction == OUT ]
+    if len(drivers) == 0:
+        for p in net:
+            p.set(value_floating())
+    elif len(drivers) == 1:
+        driver = drivers[0]
+        value = driver.get()
+        for p in net:
+            if p != driver:
+                p.set(value)
+    else:
+        for p in net:
+            p.set(value_conflict())
+
+# The netlist can bring its own resolution of the nets, as profilers do
+def propagate(nets, hook=None):
+    resolve_net = resolve if hook is None else hook
+    for net in nets:
+        resolve_net(net)
+
+def iteration(component, netlist=None):
+    if netlist is None:
+        netlist = Netlist(component)
+    with Journal() as journal:
+        generation(netlist.active)
+        propagate(netlist.nets, netlist.resolve)
+    net_of = netlist.net_of
+    return not any(p in net_of for p in journal.changed())
+
+def propagate_events(netlist, nets):
+    with Journal() as journal:
+        propagate((netlist.nets[index] for index in nets), netlist.resolve)
+    changed = { netlist.net_of[p] for p in journal.changed() }
+    pending = set()
+    for index in changed:
+        pending.update(netlist.readers[index])
+    return pending
+
+def event_iteration(netlist):
+    with Journal() as journal:
+        generation(netlist.pending)
+    net_of = netlist.net_of
+    nets = { net_of[p] for p in journal if p in net_of }
+    netlist.pending = propagate_events(netlist, nets)
+    return len(netlist.pending) == 0
+
+################################################################
+
+# Steps not settled after CYCLE_CHECK iterations keep a hash of the state of
+# the nets, updated from the points changed by every iteration. A hash seen
+# before means the circuit went back to an earlier state, and will cycle
+# forever. Deep circuits settling normally never pay for the hashing.
+CYCLE_CHECK = 16
+
+def point_hash(point, value):
+    return hash((point, value if isinstance(value, Packed) else tuple(value)))
+
+class StateHash:
+    def __init__(self, netlist):
+        self.net_of = netlist.net_of
+        self.hash = 0
+        for p in netlist.points:
+            self.hash ^= point_hash(p, p.value)
+        self.seen = {}
+
+    # Returns the length of the cycle closed by iteration n, if any
+    def update(self, journal, n, extra=0):
+        net_of = self.net_of
+        for p, old in journal.items():
+            if p in net_of:
+                self.hash ^= point_hash(p, old) ^ point_hash(p, p.value)
+        key = (self.hash, extra)
+        if key in self.seen:
+            return n - self.seen[key]
+        self.seen[key] = n
+        return None
+
+# Report of a step stopped because the circuit cycles through length states:
+# the nets changing along the cycle, and the components touching them
+class Oscillation:
+    def __init__(self, length, iteration, nets, components):
+        self.length = length
+        self.iteration = iteration
+        self.nets = nets
+        self.components = components
+
+    def __repr__(self):
+        nets = ', '.join('{' + ', '.join(sorted(p.name for p in net)) + '}' for net in self.nets)
+        components = ', '.join(sorted(c.name for c in self.components))
+        return '<Oscillation of {} iterations, found at {}: nets {}; components {}>'.format(
+            self.length, self.iteration, nets, components)
 
 ################################################################
 
 class Circuit(Component):
+    def __init__(self, name=None):
+        super().__init__(name)
+        self._netlist = None
+        self.changed = set()
+        self.observers = []
+        self.oscillation = None
+        self.cache = None
+
+    def __getstate__(self):
+        # Observers are tools attached to this copy, and stay behind
+        state = dict(vars(self))
+        state['observers'] = []
+        return state
+
+    def netlist(self):
+        if self._netlist is None or not self._netlist.is_current():
+            self._netlist = Netlist(self)
+        return self._netlist
+
+    # Levelized programs are looked up in cache, an ArtifactCache, before
+    # being generated, and stored there after
+    def use_cache(self, cache):
+        self.cache = cache
+        self._netlist = None
+        return self
+
     def add(self, component):
         if component is not self:
-            self._components.add(component)
+            self._components[component] = None
+            self.wiring.touch()
         return self
 
     def connect(self, point_a, point_b):
@@ -63,8 +186,205 @@ class Circuit(Component):
         self.wiring.disconnect(point_a, point_b)
         return self
 
-    def step(self, *, limit=100):
+    def schedule(self, *components):
+        netlist = self.netlist()
+        if len(components) == 0:
+            components = netlist.active
+        netlist.pending.update(c for c in components if c in netlist.nets_of)
+        return self
+
+    # Observers are called with the circuit after every settled step,
+    # including both phases of every cycle of run()
+    def observe(self, observer):
+        self.observers.append(observer)
+        return self
+
+    def unobserve(self, observer):
+        self.observers.remove(observer)
+        return self
+
+    # Forces bits of the net of point to symbols, given by bit index, until
+    # released. Forced nets belong to the netlist, and go away with it.
+    def force(self, point, bits):
+        netlist = self.netlist()
+        index = netlist.net_of[point]
+        net = netlist.forced.get(index, netlist.nets[index])
+        netlist.forced[index] = net
+        netlist.nets[index] = Forced(net, dict(bits))
+        self._forcing(netlist)
+        return self
+
+    def release(self, point=None):
+        netlist = self.netlist()
+        indices = list(netlist.forced) if point is None else [ netlist.net_of[point] ]
+        for index in indices:
+            netlist.nets[index] = netlist.forced.pop(index)
+        self._forcing(netlist)
+        return self
+
+    def _forcing(self, netlist):
+        # Levelized programs do not know about forced nets, and the event
+        # engine needs to look at every net again
+        netlist.artifacts.pop(LEVELIZED, None)
+        netlist.stamp = None
+
+    # Caches the outputs of the subtree of component by the values of its
+    # inputs, in an LRU table of size entries, and skips the subtree when they
+    # are found. The subtree must be purely combinational: its outputs only
+    # depend on its inputs, and only it drives them. The memo, with its hit
+    # statistics, is component.memo.
+    def memoize(self, component, size=1024):
+        component.memo = Memo(size)
+        component.wiring.touch()
+        return self
+
+    def unmemoize(self, component):
+        component.memo = None
+        component.wiring.touch()
+        return self
+
+    # Snapshot of the values and directions of all the points, and the state
+    # of the components, for restore() to go back to
+    def checkpoint(self):
+        netlist = self.netlist()
+        layout = netlist.artifacts.get('checkpoint')
+        if layout is None:
+            layout = netlist.artifacts['checkpoint'] = checkpoint.Layout(self, netlist)
+        return checkpoint.save(layout)
+
+    def restore(self, snapshot):
+        netlist = self.netlist()
+        assert snapshot.layout is netlist.artifacts.get('checkpoint'), 'Checkpoint of another circuit, or of an older netlist'
+        checkpoint.load(snapshot)
+        # The event engine starts over from every component and net
+        netlist.pending = set(netlist.active)
+        netlist.stamp = None
+        return self
+
+    def step(self, *, limit=100, engine=SWEEP):
+        # The points whose value changed during the step end up in changed
+        with Journal() as journal:
+            result = self._step(limit, engine)
+        self.changed = set(journal.changed())
+        for observer in self.observers:
+            observer(self)
+        return result
+
+    # Drives clock through cycles low/high periods, settling every phase.
+    # Probes maps names to points sampled as integers (-1 when not binary)
+    # after every cycle, and until(circuit, cycle) stops the run early.
+    # Returns whether every phase settled, the number of cycles run and the
+    # samples.
+    def run(self, clock, cycles, *, probes=None, until=None, limit=100, engine=SWEEP):
+        probes = probes or {}
+        for point in probes.values():
+            assert len(point.value) < 64, '{}: too wide to sample'.format(point.name)
+        samples = { name: array('q', bytes(8 * cycles)) for name in probes }
+        sampled = [ (samples[name], point) for name, point in probes.items() ]
+        low = value_low()
+        high = value_high()
+        observers = self.observers
+        step = self._step
+        settled = True
+        n = 0
+        with Journal() as journal:
+            while n < cycles and settled:
+                clock.OUT(low)
+                settled = step(limit, engine)[0]
+                for observer in observers:
+                    observer(self)
+                clock.OUT(high)
+                settled = step(limit, engine)[0] and settled
+                for observer in observers:
+                    observer(self)
+                for buffer, point in sampled:
+                    try:
+                        buffer[n] = value_to_int(point.value)
+                    except ValueError:
+                        buffer[n] = -1
+                n += 1
+                if until is not None and until(self, n):
+                    break
+        self.changed = set(journal.changed())
+        for buffer in samples.values():
+            del buffer[n:]
+        return (settled, n, samples)
+
+    def _step(self, limit, engine):
+        # Steps stopped by a cycle of states leave a report in oscillation
+        self.oscillation = None
+        if engine == EVENT:
+            return self._step_events(limit)
+        if engine == LEVELIZED:
+            program = self._levelized()
+            if program is not None:
+                program()
+                return (True, 0)
+        netlist = self.netlist()
+        return self._iterate(netlist, limit, lambda: iteration(self, netlist), lambda: 0)
+
+    # Iterates until settled, out of iterations, or cycling. The extra state
+    # tells apart cycles with the same values, but different things to do.
+    def _iterate(self, netlist, limit, iterate, extra):
         n = 0
-        while not iteration(self) and n < limit:
+        while n < min(CYCLE_CHECK, limit):
+            if iterate():
+                return (True, n)
             n += 1
-        return (n < limit, n)
+        state = StateHash(netlist)
+        while n < limit:
+            with Journal() as journal:
+                if iterate():
+                    return (True, n)
+            n += 1
+            length = state.update(journal, n, extra())
+            if length is not None:
+                self._oscillation(netlist, length, n, iterate)
+                return (False, n)
+        return (False, n)
+
+    def _oscillation(self, netlist, length, n, iterate):
+        # Going once more around the cycle tells the points involved
+        with Journal() as journal:
+            for k in range(length):
+                iterate()
+        nets = sorted({ netlist.net_of[p] for p in journal if p in netlist.net_of })
+        components = { c for index in nets for c in netlist.readers[index] }
+        self.oscillation = Oscillation(length, n, [ netlist.nets[index] for index in nets ], components)
+
+    def _levelized(self):
+        # Circuits with anything but gates, or with loops, stay on the sweep
+        netlist = self.netlist()
+        program = netlist.artifacts.get(LEVELIZED, False)
+        if program is False or (program is not None and not program.is_current()):
+            program = netlist.artifacts[LEVELIZED] = self._levelize(netlist)
+        return program
+
+    def _levelize(self, netlist):
+        # Forced nets are not part of the structure, and never cached. The
+        # structural hash walks the whole circuit, only worth it here.
+        if self.cache is None or len(netlist.forced) > 0:
+            return levelize(netlist)
+        fingerprint = netlist.artifacts.get('fingerprint')
+        if fingerprint is None:
+            fingerprint = netlist.artifacts['fingerprint'] = Fingerprint(self)
+        program = self.cache.program(fingerprint)
+        if program is False:
+            program = levelize(netlist)
+            self.cache.put_program(fingerprint, program)
+        return program
+
+    def _step_events(self, limit):
+        # Only components whose nets changed are evaluated again. Points set
+        # from outside the components are found from their stamps, components
+        # changed behind the wiring's back need schedule().
+        netlist = self.netlist()
+        if netlist.stamp is None:
+            nets = range(len(netlist.nets))
+        else:
+            nets = { netlist.net_of[p] for p in netlist.external if p.stamp > netlist.stamp }
+        netlist.pending |= propagate_events(netlist, nets)
+        pending = lambda: hash(frozenset(netlist.pending))
+        result = self._iterate(netlist, limit, lambda: event_iteration(netlist), pending)
+        netlist.stamp = tracking.last_stamp
+        return result
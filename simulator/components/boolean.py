@@ -1,42 +1,137 @@
+import operator
+
 from .components import Component
 from ..points import Point
 from ..value import *
 
+################################################################################
+
+# Gates reduce their inputs with a bitwise operator, then invert the result or
+# not. Any input bit that is not binary makes that output bit UNDECIDED.
+#
+# The tables are computed once per gate class, flat and indexed by symbol
+# code, in the order of SYMBOLS:
+#   - TABLE[6 * a + b]: the operator on two input bits,
+#   - FINAL[x]: the output bit for a reduced bit x.
+# The same tables as dicts by symbol serve the per bit evaluation of lists:
+# _reduce[a][b] for TABLE, and _truth_table[a][b] with FINAL applied, the
+# complete table of a two input gate.
+
+SYMBOLS = (LOW, HIGH, FLOATING, HI_Z, CONFLICT, UNDECIDED)
+CODES = { symbol: code for code, symbol in enumerate(SYMBOLS) }
+BINARY = (LOW, HIGH)
+
+def _rows(flat):
+    return { a: { b: flat[6 * CODES[a] + CODES[b]] for b in SYMBOLS } for a in SYMBOLS }
+
 class Boolean(Component):
-    def __init__(self, name=None):
+    operator = None
+    inverted = False
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        op = cls.operator
+        cls.TABLE = tuple(
+            op(a, b) if op is not None and a in BINARY and b in BINARY else UNDECIDED
+            for a in SYMBOLS for b in SYMBOLS
+        )
+        cls.FINAL = tuple( x ^ cls.inverted if x in BINARY else UNDECIDED for x in SYMBOLS )
+        cls._reduce = _rows(cls.TABLE)
+        cls._final = dict(zip(SYMBOLS, cls.FINAL))
+        cls._truth_table = _rows([ cls.FINAL[CODES[x]] for x in cls.TABLE ])
+
+    def __init__(self, name=None, inputs=2):
         super().__init__(name)
-        self.a = Point(self._subname('A')).IN()
-        self.b = Point(self._subname('B')).IN()
+        assert 1 <= inputs <= 26 and (inputs == 1 or self.operator is not None)
+        self.inputs = [ Point(self._subname(chr(ord('A') + i))).IN() for i in range(inputs) ]
         self.output = Point(self._subname('Y')).OUT(value_floating())
-        self._truth_table = { input: { input: UNDECIDED for input in [ LOW, HIGH, FLOATING, HI_Z, CONFLICT, UNDECIDED ] } for input in [ LOW, HIGH, FLOATING, HI_Z, CONFLICT, UNDECIDED ] }
+
+    @property
+    def a(self):
+        return self.inputs[0]
+
+    @property
+    def b(self):
+        return self.inputs[1]
 
     def generate(self):
-        out = ( self._truth_table[a][b] for a, b in zip(self.a.value, self.b.value) )
-        self.output.OUT(value(*out))
-    
+        inputs = self.inputs
+        if len(inputs) != 2:
+            self.output.OUT(self.evaluate([ p.value for p in inputs ]))
+            return
+        # Two lists or two words, the common cases, inline
+        a = inputs[0].value
+        b = inputs[1].value
+        if a.__class__ is list and b.__class__ is list:
+            table = self._truth_table
+            self.output.OUT([ table[x][y] for x, y in zip(a, b) ])
+        elif a.__class__ is Packed and b.__class__ is Packed and a.width == b.width:
+            self.output.OUT(self._evaluate_word(a.width, (a, b)))
+        else:
+            self.output.OUT(self.evaluate((a, b)))
+
+    # Output value for the input values
+    @classmethod
+    def evaluate(cls, values):
+        first = values[0]
+        if Packed in map(type, values):
+            width = len(first)
+            if all(len(v) == width for v in values):
+                return cls._evaluate_word(width, [ pack(v) for v in values ])
+        if len(values) == 1:
+            final = cls._final
+            return [ final[x] for x in first ]
+        # Reduced pairwise, the last pair straight to the output
+        out = first
+        reduce = cls._reduce
+        for v in values[1:-1]:
+            out = [ reduce[x][y] for x, y in zip(out, v) ]
+        table = cls._truth_table
+        return [ table[x][y] for x, y in zip(out, values[-1]) ]
+
+    @classmethod
+    def _evaluate_word(cls, width, values):
+        # All the bits at once, the bits not binary in any input are UNDECIDED
+        bits = values[0].bits
+        unknown = values[0].unknown()
+        op = cls.operator
+        for v in values[1:]:
+            bits = op(bits, v.bits)
+            unknown |= v.unknown()
+        if cls.inverted:
+            bits ^= 2**width - 1
+        if unknown == 0:
+            return Packed(width, bits)
+        return Packed(width, bits & ~unknown, undecided=unknown)
+
     def __repr__(self):
-        return '<{}> {} {} -> {}'.format(self.__class__.__name__, self.a, self.b, self.output)
+        return '<{}> {} -> {}'.format(self.__class__.__name__, ' '.join(str(p) for p in self.inputs), self.output)
+
+################################################################################
 
 class And(Boolean):
-    def __init__(self, name=None):
-        super().__init__(name)
-        self._truth_table[LOW][LOW] = LOW
-        self._truth_table[LOW][HIGH] = LOW
-        self._truth_table[HIGH][LOW] = LOW
-        self._truth_table[HIGH][HIGH] = HIGH
+    operator = operator.and_
+
+class Or(Boolean):
+    operator = operator.or_
 
 class Xor(Boolean):
-    def __init__(self, name=None):
-        super().__init__(name)
-        self._truth_table[LOW][LOW] = LOW
-        self._truth_table[LOW][HIGH] = HIGH
-        self._truth_table[HIGH][LOW] = HIGH
-        self._truth_table[HIGH][HIGH] = LOW
+    operator = operator.xor
+
+class Nand(Boolean):
+    operator = operator.and_
+    inverted = True
+
+class Nor(Boolean):
+    operator = operator.or_
+    inverted = True
+
+class Xnor(Boolean):
+    operator = operator.xor
+    inverted = True
+
+class Not(Boolean):
+    inverted = True
 
-class Or(Boolean):
     def __init__(self, name=None):
-        super().__init__(name)
-        self._truth_table[LOW][LOW] = LOW
-        self._truth_table[LOW][HIGH] = HIGH
-        self._truth_table[HIGH][LOW] = HIGH
-        self._truth_table[HIGH][HIGH] = HIGH
+        super().__init__(name, inputs=1)
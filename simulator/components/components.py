@@ -6,21 +6,49 @@ from ..wiring import Wiring
 class Component:
     def __init__(self, name=None):
         if name is None: name = self.__class__.__name__
-        self.name = name
+        self._name = name
         self.wiring = Wiring()
-        self._components = set()
+        # Ordered, so that components come in the same order in every run
+        self._components = {}
+        # Memo of the outputs of this subtree, see Circuit.memoize()
+        self.memo = None
     
+    @property
+    def name(self):
+        return str(self._name)
+
+    @name.setter
+    def name(self, name):
+        self._name = name
+
     def _subname(self, name):
-        return self.name + '.' + name
+        return Name(self, name)
     
     def _subcomponent(self, cls, name=None):
         if name is None: name = cls.__name__
         component = cls(self._subname(name))
-        self._components.add(component)
+        self._components[component] = None
+        self.wiring.touch()
         return component
 
     def generate(self):
         pass
+
+    # Internal state beyond the points, saved by checkpoints as bytes
+    def save_state(self):
+        return b''
+
+    def load_state(self, state):
+        pass
+    
+    def points(self):
+        for attribute in vars(self).values():
+            if isinstance(attribute, BasePoint):
+                yield attribute
+            elif isinstance(attribute, (list, tuple)):
+                for point in attribute:
+                    if isinstance(point, BasePoint):
+                        yield point
     
     def components(self):
         yield self
@@ -32,6 +60,22 @@ class Component:
         for component in self.components():
             yield component.wiring
 
+# Points, lists of points, or components with all their sub-components,
+# flattened into a list of points without duplicates
+def collect_points(targets):
+    points = {}
+    for target in targets:
+        if isinstance(target, BasePoint):
+            points[target] = None
+        elif isinstance(target, Component):
+            for component in target.components():
+                for point in component.points():
+                    points[point] = None
+        else:
+            for point in target:
+                points[point] = None
+    return list(points)
+
 ################################################################################
 
 class FixedWidthComponent(Component):
@@ -68,7 +68,7 @@ class Counter_161(FixedWidthComponent):
                     if self.clock.triggered():
                         n = value_to_int(self.output.get())
                         n += 1
-                        n = int_to_value(n, self.width)
+                        n = int_to_packed(n, self.width)
                         self.output.OUT(n)
             if self.output.get() == value_high(self.width):
                 self.tc.OUT(self.cet.get())
@@ -111,13 +111,13 @@ class Counter_193(FixedWidthComponent):
                     # Count up
                     n = value_to_int(self.output.get())
                     n += 1
-                    n = int_to_value(n, self.width)
+                    n = int_to_packed(n, self.width)
                     self.output.OUT(n)
                 elif self.cpu.is_high() and self.cpd.triggered():
                     # Count down
                     n = value_to_int(self.output.get())
                     n -= 1
-                    n = int_to_value(n, self.width)
+                    n = int_to_packed(n, self.width)
                     self.output.OUT(n)
                 else:
                     # Hold
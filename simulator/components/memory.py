@@ -1,9 +1,70 @@
+import functools
+import mmap
+import os
+from array import array
+
 from ..points import *
 from ..wiring import Wiring
 from .components import FixedWidthComponent
 
 ################################################################################
 
+# ROM contents are flat buffers of unsigned words: arrays, or memoryviews of
+# bytes, bytearrays and memory mapped files, cast to the word type of the data
+# width. Words wider than a byte are in native byte order. Contents are used
+# as given, so one image can be shared by any number of ROMs.
+
+def word_type(width):
+    for typecode in 'BHIQ':
+        if 8 * array(typecode).itemsize >= width:
+            return typecode
+    raise ValueError('No word type for {} bits'.format(width))
+
+def load_binary(path, width):
+    # Mapped read only, the pages are shared with the file cache
+    with open(path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return memoryview(b'').cast(word_type(width))
+        image = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    return memoryview(image).cast(word_type(width))
+
+def load_hex(path, size):
+    # Intel HEX: data, end of file and extended segment/linear address
+    # records. Bytes not in the file read as 0xFF, as in an erased chip.
+    image = bytearray(b'\xff' * size)
+    base = 0
+    with open(path) as file:
+        for number, line in enumerate(file, 1):
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            if line[0] != ':':
+                raise ValueError('{}:{}: not an Intel HEX record'.format(path, number))
+            record = bytes.fromhex(line[1:])
+            if len(record) < 5 or len(record) != record[0] + 5 or sum(record) % 256 != 0:
+                raise ValueError('{}:{}: invalid record or checksum'.format(path, number))
+            count, kind, data = record[0], record[3], record[4:-1]
+            address = (record[1] << 8) | record[2]
+            if kind == 0x00:
+                start = base + address
+                if start + count > size:
+                    raise ValueError('{}:{}: data beyond {} bytes'.format(path, number, size))
+                image[start:start + count] = data
+            elif kind == 0x01:
+                break
+            elif kind == 0x02:
+                base = int.from_bytes(data, 'big') << 4
+            elif kind == 0x04:
+                base = int.from_bytes(data, 'big') << 16
+    return image
+
+@functools.lru_cache(maxsize=None)
+def decode_table(width):
+    # Packed values of every word, shared by all the ROMs of that width
+    return tuple( int_to_packed(n, width) for n in range(2**width) )
+
+################################################################################
+
 class ROM_28C256(FixedWidthComponent):
     def __init__(self, data_width, address_width, name=None):
         super().__init__(data_width, name)
@@ -12,20 +73,181 @@ class ROM_28C256(FixedWidthComponent):
         self.data = WidePoint(self._subname('data'), self.width).HiZ()
         self.n_ce = SignalPoint(self._subname('/ce')).IN()
         self.n_oe = SignalPoint(self._subname('/oe')).IN()
-        self._content = [0] * 2**self.address_width
-    
+        self._typecode = word_type(self.width)
+        self._content = array(self._typecode, bytes(array(self._typecode).itemsize * 2**self.address_width))
+        self._decode = decode_table(self.width) if self.width <= 16 else None
+
+    def __getstate__(self):
+        # Decode tables are shared by width, and looked up again on load
+        state = dict(vars(self))
+        state['_decode'] = None
+        return state
+
+    def __setstate__(self, state):
+        vars(self).update(state)
+        self._decode = decode_table(self.width) if self.width <= 16 else None
+
     def set_content(self, content):
+        if isinstance(content, (bytes, bytearray, mmap.mmap)):
+            content = memoryview(content).cast(self._typecode)
         assert len(content) == 2**self.address_width
-        for value in content:
-            assert 0 <= value < 2**self.width
+        if isinstance(content, memoryview):
+            assert content.format == self._typecode, 'Expected {} words'.format(self._typecode)
+        elif not (isinstance(content, array) and content.typecode == self._typecode):
+            # Checked before the conversion, which only fails on words too big
+            # for the word type
+            assert min(content) >= 0 and max(content) < 2**self.width
+            content = array(self._typecode, content)
+        # Words fill their type exactly unless the width is not a whole type
+        if self.width < 8 * content.itemsize:
+            assert max(content) < 2**self.width
         self._content = content
         return self
-    
+
+    def load_binary(self, path):
+        return self.set_content(load_binary(path, self.width))
+
+    def load_hex(self, path):
+        return self.set_content(load_hex(path, array(self._typecode).itemsize * 2**self.address_width))
+
     def generate(self):
         if self.n_ce.is_high() or self.n_oe.is_high():
             self.data.HiZ()
         else:
             index = value_to_int(self.address.get())
             data = self._content[index]
-            data_value = int_to_value(data, self.width)
-            self.data.OUT(data_value)
+            if self._decode is not None:
+                self.data.OUT(self._decode[data])
+            else:
+                self.data.OUT(int_to_packed(data, self.width))
+
+################################################################################
+
+# Static RAM: /ce low selects the chip, then /we low writes the data pins to
+# the word at the address for as long as it stays low, and /oe low with /we
+# high reads it. The words live in an array, in pages of PAGE words; pages
+# written since the last clear_dirty() are dirty, so that copies of the
+# content can be limited to what changed.
+
+PAGE = 256
+
+class RAM_62256(FixedWidthComponent):
+    def __init__(self, data_width, address_width, name=None):
+        super().__init__(data_width, name)
+        self.address_width = address_width
+        self.address = WidePoint(self._subname('address'), self.address_width).IN()
+        self.data = WidePoint(self._subname('data'), self.width).HiZ()
+        self.n_ce = SignalPoint(self._subname('/ce')).IN()
+        self.n_oe = SignalPoint(self._subname('/oe')).IN()
+        self.n_we = SignalPoint(self._subname('/we')).IN()
+        self._typecode = word_type(self.width)
+        self._content = array(self._typecode, bytes(array(self._typecode).itemsize * 2**self.address_width))
+        self._decode = decode_table(self.width) if self.width <= 16 else None
+        self._dirty = set()
+        # Whether a write began while the data pins still held a read
+        self._pending = False
+
+    __getstate__ = ROM_28C256.__getstate__
+    __setstate__ = ROM_28C256.__setstate__
+
+    def __len__(self):
+        return len(self._content)
+
+    def __getitem__(self, index):
+        return self._content[index]
+
+    def __setitem__(self, index, word):
+        assert 0 <= word < 2**self.width
+        if self._content[index] != word:
+            self._content[index] = word
+            self._dirty.add(index // PAGE)
+
+    ############################################################################
+
+    # Words from a buffer, an array, a list, or a file given by its path,
+    # written from offset on
+    def load(self, source, offset=0):
+        if isinstance(source, str):
+            with open(source, 'rb') as file:
+                source = file.read()
+        if isinstance(source, (bytes, bytearray, memoryview, mmap.mmap)):
+            words = array(self._typecode)
+            words.frombytes(source)
+            source = words
+        elif not (isinstance(source, array) and source.typecode == self._typecode):
+            assert len(source) == 0 or (min(source) >= 0 and max(source) < 2**self.width)
+            source = array(self._typecode, source)
+        assert offset + len(source) <= len(self._content)
+        if len(source) == 0:
+            return self
+        if self.width < 8 * source.itemsize:
+            assert max(source) < 2**self.width
+        self._content[offset:offset + len(source)] = source
+        self._dirty.update(range(offset // PAGE, (offset + len(source) + PAGE - 1) // PAGE))
+        return self
+
+    # Bytes of the words in [start, stop), also written to the file given by
+    # its path, if any
+    def dump(self, path=None, start=0, stop=None):
+        data = self._content[start:stop].tobytes()
+        if path is not None:
+            with open(path, 'wb') as file:
+                file.write(data)
+        return data
+
+    def dirty_pages(self):
+        return sorted(self._dirty)
+
+    # Copies of the dirty pages, by page number
+    def dirty_content(self):
+        return { page: self.dump(None, page * PAGE, (page + 1) * PAGE) for page in self.dirty_pages() }
+
+    def clear_dirty(self):
+        self._dirty.clear()
+        return self
+
+    def save_state(self):
+        # Whole, checkpoints are restored in any order and cannot build on
+        # each other; dirty pages are for the owner of the RAM to clear
+        return self._content.tobytes()
+
+    def load_state(self, state):
+        # In place, and every page counts as dirty
+        memoryview(self._content).cast('B')[:] = state
+        self._dirty.update(range((len(self._content) + PAGE - 1) // PAGE))
+
+    ############################################################################
+
+    def generate(self):
+        if self._pending:
+            # The bus value came in since the write began
+            self._pending = False
+            if self.data.direction == IN:
+                self._store()
+        if not self.n_ce.is_low():
+            self.data.HiZ()
+        elif self.n_we.is_low():
+            if self.data.direction != IN:
+                # The data pins still hold what they drove, the bus value only
+                # comes with the next propagation
+                self.data.IN()
+                self._pending = True
+                return
+            self._store()
+        elif self.n_oe.is_low():
+            word = self._content[value_to_int(self.address.get())]
+            if self._decode is not None:
+                self.data.OUT(self._decode[word])
+            else:
+                self.data.OUT(int_to_packed(word, self.width))
+        else:
+            self.data.HiZ()
+
+    def _store(self):
+        try:
+            word = value_to_int(self.data.get())
+            index = value_to_int(self.address.get())
+        except ValueError:
+            # Only settled binary data is stored, at a settled address
+            return
+        self[index] = word
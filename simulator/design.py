@@ -0,0 +1,320 @@
+import importlib
+import io
+import pickle
+import sys
+from array import array
+
+from .components.components import Component
+from .netlist import Netlist
+from .points import BasePoint, TriggerPoint, WidePoint
+from .value import *
+from .wiring import Wiring
+
+################################################################################
+
+# Design files: a circuit with all of its components, points and wirings, in
+# columnar tables read back in bulk, without running any constructor or
+# replaying any connect(). In order, after the magic and the byte order:
+#   - strings: class paths and point names, NUL separated,
+#   - components: the class of each one, the circuit first,
+#   - points: class, name, name parent (component + 1, 0 for none), width
+#     of the value, direction, flags, and the symbol codes of the values of
+#     all the points one after the other,
+#   - wirings: the connections of every point (keys, offsets into the
+#     neighbours), and the nets (roots, offsets into the members), with the
+#     offsets of each wiring into the keys and into the roots, then the nets
+#     of the netlist (offsets into the members),
+#   - contents: the arrays and memoryviews held by components, such as ROM
+#     and RAM words, raw, or only their type and length,
+#   - states: the attributes of every component, pickled, with points,
+#     components, wirings and contents referring to the tables above.
+# Every table is an array, written as its typecode, its length and its items
+# in the byte order of the header. Of the netlist, only the nets are saved:
+# the rest is built again from them on load.
+#
+# Loading imports the modules named in the file and unpickles the states, so
+# opening a design file runs whatever code it asks for: only load trusted
+# files.
+
+MAGIC = b'SIMDSGN1'
+SYMBOLS = (LOW, HIGH, FLOATING, HI_Z, CONFLICT, UNDECIDED)
+CODES = { symbol: code for code, symbol in enumerate(SYMBOLS) }
+WAS_LOW = 1
+PACKED = 2
+
+def class_path(cls):
+    return '{}:{}'.format(cls.__module__, cls.__qualname__)
+
+def find_class(path):
+    module, name = path.split(':')
+    cls = importlib.import_module(module)
+    for part in name.split('.'):
+        cls = getattr(cls, part)
+    return cls
+
+def _write_array(file, a):
+    file.write(a.typecode.encode())
+    file.write(len(a).to_bytes(8, 'little'))
+    a.tofile(file)
+
+def _read_array(file, swap):
+    typecode = file.read(1).decode()
+    count = int.from_bytes(file.read(8), 'little')
+    a = array(typecode)
+    a.fromfile(file, count)
+    if swap:
+        a.byteswap()
+    return a
+
+################################################################################
+
+class _Pickler(pickle.Pickler):
+    def __init__(self, file, saver):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.saver = saver
+
+    def persistent_id(self, obj):
+        return self.saver.reference(obj)
+
+class _Saver:
+    def __init__(self, circuit):
+        self.strings = {}
+        self.components = list(circuit.components())
+        self.component_index = { c: i for i, c in enumerate(self.components) }
+        self.points = []
+        self.point_index = {}
+        self.wirings = []
+        self.wiring_index = {}
+        self.arrays = []
+        self.array_index = {}
+
+    def string(self, s):
+        if s not in self.strings:
+            self.strings[s] = len(self.strings)
+        return self.strings[s]
+
+    def component(self, c):
+        if c not in self.component_index:
+            self.component_index[c] = len(self.components)
+            self.components.append(c)
+        return self.component_index[c]
+
+    def point(self, p):
+        if p not in self.point_index:
+            self.point_index[p] = len(self.points)
+            self.points.append(p)
+        return self.point_index[p]
+
+    def reference(self, obj):
+        if isinstance(obj, BasePoint):
+            return ('p', self.point(obj))
+        if isinstance(obj, Component):
+            return ('c', self.component(obj))
+        if isinstance(obj, Wiring):
+            if obj not in self.wiring_index:
+                self.wiring_index[obj] = len(self.wirings)
+                self.wirings.append(obj)
+            return ('w', self.wiring_index[obj])
+        if isinstance(obj, Netlist):
+            return ('n',)
+        if isinstance(obj, (array, memoryview)):
+            key = id(obj)
+            if key not in self.array_index:
+                self.array_index[key] = len(self.arrays)
+                self.arrays.append(obj)
+            return ('a', self.array_index[key])
+        return None
+
+    def states(self):
+        # In lists, as long as states bring in more components
+        buffer = io.BytesIO()
+        pickler = _Pickler(buffer, self)
+        done = 0
+        while done < len(self.components):
+            components = self.components[done:]
+            pickler.dump([ c.__getstate__() if hasattr(c, '__getstate__') else vars(c) for c in components ])
+            done += len(components)
+        return pickler, buffer
+
+def save(circuit, path, *, contents=True):
+    saver = _Saver(circuit)
+    pickler, buffer = saver.states()
+
+    # Wirings, which can bring in points found nowhere else
+    wiring_keys = array('I', [ 0 ])
+    keys = array('I')
+    offsets = array('I', [ 0 ])
+    neighbours = array('I')
+    wiring_roots = array('I', [ 0 ])
+    roots = array('I')
+    member_offsets = array('I', [ 0 ])
+    members = array('I')
+    point = saver.point
+    for wiring in saver.wirings:
+        for p, connections in wiring.connections.items():
+            keys.append(point(p))
+            neighbours.extend( point(q) for q in connections )
+            offsets.append(len(neighbours))
+        wiring_keys.append(len(keys))
+        for root, net in wiring._members.items():
+            roots.append(point(root))
+            members.extend( point(q) for q in net )
+            member_offsets.append(len(members))
+        wiring_roots.append(len(roots))
+    wirings = [ wiring_keys, keys, offsets, neighbours, wiring_roots, roots, member_offsets, members ]
+
+    # The nets of the netlist, in order, so that the netlist needs no merging
+    # of the wirings on load, and nets keep their indices
+    net_offsets = array('I', [ 0 ])
+    net_members = array('I')
+    for net in circuit.netlist().nets:
+        net_members.extend( point(q) for q in net )
+        net_offsets.append(len(net_members))
+    wirings += [ net_offsets, net_members ]
+
+    # Points with attributes beyond their slots keep them in the states
+    extras = [ (i, vars(p)) for i, p in enumerate(saver.points) if len(getattr(p, '__dict__', ())) > 0 ]
+    pickler.dump(extras)
+
+    classes = array('I', ( saver.string(class_path(type(c))) for c in saver.components ))
+    point_columns = [ array('I'), array('I'), array('I'), array('I'), array('B'), array('B') ]
+    codes = array('B')
+    for p in saver.points:
+        cls, name, parent, width, direction, flags = point_columns
+        cls.append(saver.string(class_path(type(p))))
+        name.append(saver.string(p._local_name))
+        parent.append(0 if p._parent is None else saver.component(p._parent) + 1)
+        width.append(len(p.value))
+        direction.append(p.direction)
+        flags.append((WAS_LOW if isinstance(p, TriggerPoint) and p._was_low else 0)
+            | (PACKED if isinstance(p.value, Packed) else 0))
+        codes.extend( CODES[x] for x in p.value )
+    assert len(classes) == len(saver.components), 'Components found in point names only'
+
+    with open(path, 'wb') as file:
+        file.write(MAGIC)
+        file.write(b'L' if sys.byteorder == 'little' else b'B')
+        strings = '\0'.join(saver.strings).encode()
+        _write_array(file, array('B', strings))
+        _write_array(file, classes)
+        for column in point_columns:
+            _write_array(file, column)
+        _write_array(file, codes)
+        for table in wirings:
+            _write_array(file, table)
+        _write_array(file, array('I', [ len(saver.arrays) ]))
+        for a in saver.arrays:
+            typecode = a.typecode if isinstance(a, array) else a.format
+            _write_array(file, array('B', typecode.encode()))
+            _write_array(file, array('Q', [ len(a) ]))
+            if contents:
+                _write_array(file, a if isinstance(a, array) else array(typecode, a.tobytes()))
+            else:
+                _write_array(file, array(typecode))
+        _write_array(file, array('B', buffer.getvalue()))
+
+################################################################################
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, file, tables):
+        super().__init__(file)
+        self.tables = tables
+
+    def persistent_load(self, pid):
+        if pid[0] == 'n':
+            return None
+        return self.tables[pid[0]][pid[1]]
+
+def load(path):
+    with open(path, 'rb') as file:
+        assert file.read(len(MAGIC)) == MAGIC, '{}: not a design file'.format(path)
+        order = file.read(1)
+        swap = order != (b'L' if sys.byteorder == 'little' else b'B')
+        read = lambda: _read_array(file, swap)
+        strings = read().tobytes().decode().split('\0')
+        classes = {}
+        def resolved(index):
+            if index not in classes:
+                classes[index] = find_class(strings[index])
+            return classes[index]
+
+        components = [ resolved(i).__new__(resolved(i)) for i in read() ]
+
+        point_classes, names, parents, widths, directions, flags = [ read() for n in range(6) ]
+        codes = read().tobytes()
+        kinds = {}
+        for index in set(point_classes):
+            cls = resolved(index)
+            kinds[index] = (cls, issubclass(cls, WidePoint), issubclass(cls, TriggerPoint))
+        owners = [ None ] + components
+        # Lists are shared between points with the same value, as driven
+        # values are
+        decoded = {}
+        points = []
+        offset = 0
+        for kind, name, parent, width, direction, flag in zip(point_classes, names, parents, widths, directions, flags):
+            cls, wide, trigger = kinds[kind]
+            p = cls.__new__(cls)
+            p._parent = owners[parent]
+            p._local_name = strings[name]
+            p.stamp = 0
+            p.direction = direction
+            if wide:
+                p.width = width
+            if trigger:
+                p._was_low = bool(flag & WAS_LOW)
+            key = (codes[offset:offset + width], flag & PACKED)
+            value = decoded.get(key)
+            if value is None:
+                value = [ SYMBOLS[x] for x in key[0] ]
+                if key[1]:
+                    value = pack(value)
+                decoded[key] = value
+            p.value = value
+            offset += width
+            points.append(p)
+
+        wiring_keys, keys, offsets, neighbours, wiring_roots, roots, member_offsets, members = [ read() for n in range(8) ]
+        net_offsets, net_members = read(), read()
+        neighbours = [ points[q] for q in neighbours ]
+        members = [ points[q] for q in members ]
+        wirings = []
+        for n in range(len(wiring_keys) - 1):
+            wiring = Wiring()
+            connections = wiring.connections
+            for k in range(wiring_keys[n], wiring_keys[n + 1]):
+                connections[points[keys[k]]] = set(neighbours[offsets[k]:offsets[k + 1]])
+            parent = wiring._parent
+            for k in range(wiring_roots[n], wiring_roots[n + 1]):
+                root = points[roots[k]]
+                net = wiring._members[root] = set(members[member_offsets[k]:member_offsets[k + 1]])
+                parent.update(dict.fromkeys(net, root))
+            wirings.append(wiring.touch())
+
+        arrays = []
+        for n in range(read()[0]):
+            typecode = read().tobytes().decode()
+            length = read()[0]
+            words = read()
+            if len(words) < length:
+                words = array(typecode, bytes(words.itemsize * length))
+            arrays.append(words)
+
+        tables = { 'p': points, 'c': components, 'w': wirings, 'a': arrays }
+        unpickler = _Unpickler(io.BytesIO(read().tobytes()), tables)
+        states = []
+        while len(states) < len(components):
+            states += unpickler.load()
+        for c, state in zip(components, states):
+            if hasattr(c, '__setstate__'):
+                c.__setstate__(state)
+            else:
+                vars(c).update(state)
+        for i, extra in unpickler.load():
+            vars(points[i]).update(extra)
+
+    circuit = components[0]
+    net_members = [ points[q] for q in net_members ]
+    nets = [ tuple(net_members[net_offsets[k]:net_offsets[k + 1]]) for k in range(len(net_offsets) - 1) ]
+    circuit._netlist = Netlist(circuit, nets)
+    return circuit
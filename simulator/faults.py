@@ -0,0 +1,112 @@
+import concurrent.futures
+import os
+import pickle
+from collections import namedtuple
+
+from .circuit import SWEEP
+from .value import *
+
+################################################################################
+
+# Stuck-at fault simulation: every bit of every net of the netlist, stuck at
+# LOW then at HIGH, is detected by a sequence of input vectors when some
+# output differs from the fault free circuit after some vector. Faults stop
+# being simulated at the first vector detecting them.
+#
+# Faults are sharded across a process pool. Every worker gets a pickled copy
+# of the circuit with its netlist, so faults can name nets by index.
+
+Fault = namedtuple('Fault', [ 'net', 'bit', 'symbol' ])
+
+def enumerate_faults(circuit):
+    netlist = circuit.netlist()
+    return [
+        Fault(index, bit, symbol)
+        for index, net in enumerate(netlist.nets)
+        for bit in range(len(net[0].value))
+        for symbol in (LOW, HIGH)
+    ]
+
+class Simulator:
+    def __init__(self, circuit, inputs, outputs, vectors, *, engine=SWEEP, limit=100):
+        self.circuit = circuit
+        self.inputs = inputs
+        self.outputs = outputs
+        self.vectors = vectors
+        self.engine = engine
+        self.limit = limit
+        self.initial = circuit.checkpoint()
+        self.golden = [ self._apply(vector) for vector in vectors ]
+
+    def _apply(self, vector):
+        for point, value in zip(self.inputs, vector):
+            point.OUT(value)
+        self.circuit.step(engine=self.engine, limit=self.limit)
+        return [ list(point.get()) for point in self.outputs ]
+
+    # Index of the first vector detecting the fault, or None
+    def detect(self, fault):
+        net = self.circuit.netlist().nets[fault.net]
+        self.circuit.restore(self.initial)
+        self.circuit.force(net[0], { fault.bit: fault.symbol })
+        try:
+            for k, vector in enumerate(self.vectors):
+                if self._apply(vector) != self.golden[k]:
+                    return k
+            return None
+        finally:
+            self.circuit.release()
+
+################################################################################
+
+_worker = None
+
+def _start_worker(payload, engine, limit):
+    global _worker
+    _worker = Simulator(*pickle.loads(payload), engine=engine, limit=limit)
+
+def _detect_all(faults):
+    return [ (fault, _worker.detect(fault)) for fault in faults ]
+
+class Report:
+    def __init__(self, circuit, faults, detected):
+        self.circuit = circuit
+        self.faults = faults
+        # Index of the detecting vector, by detected fault
+        self.detected = detected
+
+    @property
+    def coverage(self):
+        return len(self.detected) / len(self.faults) if len(self.faults) > 0 else 1.0
+
+    def undetected(self):
+        return [ fault for fault in self.faults if fault not in self.detected ]
+
+    def describe(self, fault):
+        net = self.circuit.netlist().nets[fault.net]
+        return '{{{}}}[{}] stuck at {}'.format(', '.join(sorted(p.name for p in net)), fault.bit, fault.symbol)
+
+# Simulates faults (all of them by default) against the vectors, each one a
+# value per input point. Workers is the size of the process pool, 0 to run in
+# this process.
+def simulate(circuit, inputs, outputs, vectors, *, faults=None, workers=None, chunk=None, engine=SWEEP, limit=100):
+    if faults is None:
+        faults = enumerate_faults(circuit)
+    results = []
+    if workers == 0:
+        simulator = Simulator(circuit, inputs, outputs, vectors, engine=engine, limit=limit)
+        results = [ (fault, simulator.detect(fault)) for fault in faults ]
+        circuit.restore(simulator.initial)
+    else:
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if chunk is None:
+            chunk = max(1, len(faults) // (4 * workers))
+        payload = pickle.dumps((circuit, inputs, outputs, vectors), protocol=pickle.HIGHEST_PROTOCOL)
+        initargs = (payload, engine, limit)
+        with concurrent.futures.ProcessPoolExecutor(workers, initializer=_start_worker, initargs=initargs) as pool:
+            shards = [ faults[i:i + chunk] for i in range(0, len(faults), chunk) ]
+            for shard in pool.map(_detect_all, shards):
+                results.extend(shard)
+    detected = { fault: k for fault, k in results if k is not None }
+    return Report(circuit, faults, detected)
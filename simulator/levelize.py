@@ -0,0 +1,154 @@
+from .components import boolean
+from .points import IN, OUT
+from .value import *
+
+################################################################################
+
+# Levelized evaluation of acyclic gate level circuits: the gates are sorted in
+# topological order once, and emitted as straight-line Python code settling
+# the whole circuit in a single pass, instead of iterating to a fixpoint.
+
+# Version of the generated code, part of the key of cached programs: bumped
+# whenever the generator changes what it emits or which netlists it accepts
+VERSION = 2
+
+# The code object can come compiled already, from a cache of artifacts.
+class Program:
+    def __init__(self, source, points, gates, guarded, code=None):
+        self.source = source
+        self.points = points
+        self.gates = gates
+        self.tables = [ (gate._reduce, gate._truth_table, gate._final) for gate in gates ]
+        self.guarded = guarded
+        self.guard = self._guard()
+        if code is None:
+            code = compile(source, '<levelized>', 'exec')
+        self.code = code
+        namespace = { 'value_floating': value_floating, 'value_conflict': value_conflict }
+        exec(code, namespace)
+        self.evaluate = namespace['evaluate']
+
+    # The code is specialized for the directions and widths of the points
+    # driven from outside the gates, at the time it was generated.
+    def _guard(self):
+        return [ (p.direction, len(p.value)) for p in self.guarded ]
+
+    def is_current(self):
+        return self._guard() == self.guard
+
+    def __call__(self):
+        self.evaluate(self.points, self.tables)
+
+################################################################################
+
+def levelize(netlist):
+    gates = netlist.active
+    if not all(isinstance(gate, boolean.Boolean) for gate in gates) or len(netlist.forced) > 0:
+        return None
+
+    indices = {}
+    def index(point):
+        if point not in indices:
+            indices[point] = len(indices)
+        return indices[point]
+
+    outputs = { gate.output: gate for gate in gates }
+    # Gates driving a net along with anything else make a conflict, which the
+    # sweep settles through
+    for net in netlist.nets:
+        drivers = [ p for p in net if p.direction == OUT ]
+        if len(drivers) > 1 and any(p in outputs for p in drivers):
+            return None
+    owned = set(outputs)
+    for gate in gates:
+        owned |= set(gate.inputs)
+
+    # Gates depend on the gates driving the nets they read
+    def driver(point):
+        if point not in netlist.net_of:
+            return None
+        drivers = [ p for p in netlist.nets[netlist.net_of[point]] if p.direction == OUT ]
+        if len(drivers) == 1:
+            return outputs.get(drivers[0])
+        return None
+
+    dependencies = { gate: { driver(p) for p in gate.inputs } - { None } for gate in gates }
+    order = []
+    ready = [ gate for gate in gates if len(dependencies[gate]) == 0 ]
+    dependents = { gate: [] for gate in gates }
+    for gate, inputs in dependencies.items():
+        for other in inputs:
+            dependents[other].append(gate)
+    remaining = { gate: len(inputs) for gate, inputs in dependencies.items() }
+    while len(ready) > 0:
+        gate = ready.pop()
+        order.append(gate)
+        for other in dependents[gate]:
+            remaining[other] -= 1
+            if remaining[other] == 0:
+                ready.append(other)
+    if len(order) != len(gates):
+        # Combinational loop
+        return None
+
+    lines = []
+    def emit_net(net, value):
+        for p in net:
+            if p.direction == IN:
+                lines.append('    p{}.set({})'.format(index(p), value))
+
+    # Nets that are not driven by a gate settle first
+    for net in netlist.nets:
+        drivers = [ p for p in net if p.direction == OUT ]
+        if len(drivers) == 1 and drivers[0] in outputs:
+            continue
+        if len(drivers) == 0:
+            emit_net(net, 'value_floating()')
+        elif len(drivers) == 1:
+            lines.append('    v = p{}.value'.format(index(drivers[0])))
+            emit_net([ p for p in net if p is not drivers[0] ], 'v')
+        else:
+            emit_net(net, 'value_conflict()')
+
+    # Inputs get the width of the value driving their net, which for gates
+    # earlier in the order is known before any of it is evaluated
+    widths = {}
+    def width(point):
+        if point not in netlist.net_of:
+            return len(point.value)
+        drivers = [ p for p in netlist.nets[netlist.net_of[point]] if p.direction == OUT ]
+        if len(drivers) != 1:
+            return 1
+        if drivers[0] in outputs:
+            return widths[outputs[drivers[0]]]
+        return len(drivers[0].value)
+
+    # Per bit lookups in the tables of the gate class: the inputs reduced
+    # pairwise, the last pair straight to the output
+    for n, gate in enumerate(order):
+        inputs = gate.inputs
+        widths[gate] = min(width(p) for p in inputs)
+        for k, p in enumerate(inputs):
+            lines.append('    i{} = p{}.value'.format(k, index(p)))
+        def bit(i):
+            if len(inputs) == 1:
+                return 'f{}[i0[{}]]'.format(n, i)
+            x = 'i0[{}]'.format(i)
+            for k in range(1, len(inputs) - 1):
+                x = 'r{}[{}][i{}[{}]]'.format(n, x, k, i)
+            return 't{}[{}][i{}[{}]]'.format(n, x, len(inputs) - 1, i)
+        lines.append('    v = [ {} ]'.format(', '.join(bit(i) for i in range(widths[gate]))))
+        lines.append('    p{}.OUT(v)'.format(index(gate.output)))
+        if gate.output in netlist.net_of:
+            net = netlist.nets[netlist.net_of[gate.output]]
+            emit_net([ p for p in net if p is not gate.output ], 'v')
+
+    points = list(indices)
+    header = [ 'def evaluate(P, T):' ]
+    header += [ '    p{} = P[{}]'.format(i, i) for i in range(len(points)) ]
+    header += [ '    r{0}, t{0}, f{0} = T[{0}]'.format(n) for n in range(len(order)) ]
+    source = '\n'.join(header + lines + [ '    return' ]) + '\n'
+
+    guarded = [ p for p in netlist.points if p not in owned ]
+    guarded += [ p for p in owned if p not in netlist.net_of ]
+    return Program(source, points, order, guarded)
@@ -0,0 +1,125 @@
+from collections import OrderedDict
+
+from .points import OUT, Journal
+from .value import *
+from .wiring import Wiring
+
+################################################################################
+
+# Memoized evaluation of purely combinational subtrees: the outputs of the
+# subtree only depend on the values of its inputs, so they are cached in a
+# bounded LRU table keyed by those values.
+#
+# The memo lives on the root component of the subtree, and survives new
+# netlists as long as the wirings of the subtree did not change.
+
+class Memo:
+    def __init__(self, size=1024):
+        assert size > 0
+        self.size = size
+        self.table = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.revisions = None
+
+    def lookup(self, key):
+        outputs = self.table.get(key)
+        if outputs is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.table.move_to_end(key)
+        return outputs
+
+    def store(self, key, outputs):
+        self.table[key] = outputs
+        if len(self.table) > self.size:
+            self.table.popitem(last=False)
+            self.evictions += 1
+
+    # Forgets everything when the wirings changed since the last call
+    def validate(self, revisions):
+        if revisions != self.revisions:
+            if len(self.table) > 0:
+                self.invalidations += 1
+            self.table.clear()
+            self.revisions = revisions
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+    def __repr__(self):
+        return '<Memo {}/{} entries, {} hits, {} misses ({:.1%}), {} evictions, {} invalidations>'.format(
+            len(self.table), self.size, self.hits, self.misses, self.hit_rate, self.evictions, self.invalidations)
+
+################################################################################
+
+# A memoized subtree, evaluated by the engines in place of its components.
+# The inputs are the points of the root component on nets of the subtree that
+# nothing inside drives; the cached outputs are the values of every point
+# driven inside, so that the nets inside settle from them too.
+class Block:
+    def __init__(self, root, components, netlist):
+        self.root = root
+        self.name = root.name
+        self.memo = root.memo
+        self.components = components
+        self.netlist = netlist
+        self.memo.validate([ (w, w.revision) for w in root.wirings() ])
+
+        wiring = Wiring()
+        for w in root.wirings():
+            wiring.merge(w)
+        self.drivers = [ p for c in components for p in c.points() if p.direction == OUT ]
+        driven = set(self.drivers)
+        ports = set(root.points())
+        self.inputs = []
+        self.nets = []
+        for net in wiring.nets():
+            drivers = [ p for p in net if p in driven ]
+            assert len(drivers) <= 1, '{}: memoized subtrees must be combinational, {} drivers on a net'.format(
+                self.name, len(drivers))
+            if len(drivers) == 0:
+                self.inputs += [ p for p in net if p in ports ]
+            else:
+                self.nets.append((drivers[0], [ p for p in net if p is not drivers[0] ]))
+
+    def points(self):
+        for c in self.root.components():
+            yield from c.points()
+
+    def generate(self):
+        if len(self.netlist.forced) > 0:
+            # Forced nets may be inside, nothing is cached meanwhile
+            for c in self.components:
+                c.generate()
+            return
+        key = tuple( v if v.__class__ is Packed else tuple(v) for v in ( p.value for p in self.inputs ) )
+        outputs = self.memo.lookup(key)
+        if outputs is not None:
+            for p, v in zip(self.drivers, outputs):
+                p.OUT(v)
+            return
+        if self._settle():
+            self.memo.store(key, tuple( p.value for p in self.drivers ))
+
+    def _settle(self):
+        # Acyclic subtrees settle within one iteration per component
+        for n in range(len(self.components) + 1):
+            with Journal() as journal:
+                for c in self.components:
+                    c.generate()
+                for driver, readers in self.nets:
+                    value = driver.value
+                    for p in readers:
+                        p.set(value)
+            if len(journal.changed()) == 0:
+                return True
+        return False
+
+    def __repr__(self):
+        return '<Block {}> {}'.format(self.name, self.memo)
@@ -0,0 +1,84 @@
+from .components.components import Component
+from .memo import Block
+from .wiring import Wiring
+
+################################################################################
+
+# Flattened view of a component hierarchy: its components, and all of its
+# wirings resolved into nets (groups of points connected together).
+# The nets can be given, as loaded from a design file, instead of merging all
+# the wirings again.
+class Netlist:
+    def __init__(self, component, nets=None):
+        self.components = list(component.components())
+        self._revisions = [ (c.wiring, c.wiring.revision) for c in self.components ]
+
+        if nets is None:
+            wiring = Wiring()
+            for c in self.components:
+                wiring.merge(c.wiring)
+            nets = wiring.nets()
+        self.revision = Wiring.last_revision
+
+        self.nets = []
+        self.net_of = {}
+        for net in nets:
+            for p in net:
+                self.net_of[p] = len(self.nets)
+            self.nets.append(tuple(net))
+        self.points = list(self.net_of)
+
+        # Fanout index for the event driven engine: the nets each component
+        # touches, and the components to evaluate again when a net changes.
+        # Components that do not override generate() never need evaluating.
+        self.active = [ c for c in self.components if type(c).generate is not Component.generate ]
+        # Memoized subtrees are evaluated as one block each, in place of their
+        # components. Roots come before the components under them.
+        self.blocks = []
+        memoized = set()
+        for c in self.components:
+            if c.memo is not None and c not in memoized:
+                subtree = set(c.components())
+                memoized |= subtree
+                self.blocks.append(Block(c, [ x for x in self.active if x in subtree ], self))
+        if len(self.blocks) > 0:
+            self.active = [ c for c in self.active if c not in memoized ] + self.blocks
+        self.nets_of = {}
+        self.readers = [ [] for net in self.nets ]
+        for c in self.active:
+            nets = { self.net_of[p] for p in c.points() if p in self.net_of }
+            self.nets_of[c] = tuple(nets)
+            for index in nets:
+                self.readers[index].append(c)
+        self.pending = set(self.active)
+        # Points not belonging to any evaluated component, which can only
+        # change from outside the circuit, and the stamp they were last
+        # checked at (None until the first event driven step).
+        owned = { p for c in self.active for p in c.points() }
+        self.external = [ p for p in self.points if p not in owned ]
+        self.stamp = None
+
+        # Nets forced by Circuit.force(), by index, with their original points
+        self.forced = {}
+
+        # Compiled forms of this netlist built by the engines, by engine
+        self.artifacts = {}
+
+        # Replacement for resolve() on the nets of this netlist only, or None
+        self.resolve = None
+
+    def __getstate__(self):
+        # Compiled forms are not picklable, and are built again on demand
+        state = dict(vars(self))
+        state['artifacts'] = {}
+        state['resolve'] = None
+        return state
+
+    def is_current(self):
+        if self.revision == Wiring.last_revision:
+            return True
+        for wiring, revision in self._revisions:
+            if wiring.revision != revision:
+                return False
+        self.revision = Wiring.last_revision
+        return True
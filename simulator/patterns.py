@@ -0,0 +1,175 @@
+from .components import boolean
+from .points import IN, OUT
+from .value import *
+
+################################################################################
+
+# Pattern parallel simulation of gate level circuits: every bit of every point
+# carries up to thousands of test patterns at once, pattern k being bit k of
+# three integer planes:
+#   - value: the binary value of the bit,
+#   - unknown: set for the non-binary states,
+#   - kind: tells the non-binary states apart, together with value.
+# Binary patterns leave unknown and kind at 0, so purely binary circuits only
+# ever operate on the value plane.
+
+STATES = {
+    LOW: (0, 0, 0),
+    HIGH: (1, 0, 0),
+    FLOATING: (0, 1, 0),
+    HI_Z: (1, 1, 0),
+    CONFLICT: (0, 1, 1),
+    UNDECIDED: (1, 1, 1),
+}
+
+def signal(symbol, full):
+    return tuple( full if plane else 0 for plane in STATES[symbol] )
+
+def symbol_at(signal, k):
+    state = tuple( (plane >> k) & 1 for plane in signal )
+    for symbol, planes in STATES.items():
+        if planes == state:
+            return symbol
+
+def exhaustive_plane(i, n):
+    # Pattern k holds bit i (MSB first) of k among n bits
+    period = 2**(n - 1 - i)
+    block = (2**period - 1) << period
+    return block * (2**(2**n) - 1) // (2**(2 * period) - 1)
+
+################################################################################
+
+# Gates reduce the value planes with their operator. Any input not binary
+# makes the output UNDECIDED, which sets all three planes.
+class Gate:
+    def __init__(self, component):
+        self.component = component
+        self.operator = component.operator
+        self.inverted = component.inverted
+
+    def evaluate(self, inputs, full):
+        value = inputs[0][0]
+        unknown = inputs[0][1]
+        for x in inputs[1:]:
+            value = self.operator(value, x[0])
+            unknown |= x[1]
+        if self.inverted:
+            value ^= full
+        if unknown == 0:
+            return (value, 0, 0)
+        return (value | unknown, unknown, unknown)
+
+################################################################################
+
+class Patterns:
+    def __init__(self, circuit, count):
+        self.count = count
+        self.full = 2**count - 1
+        self.netlist = circuit.netlist()
+        self.gates = []
+        for component in self.netlist.active:
+            if not isinstance(component, boolean.Boolean):
+                raise TypeError('{}: pattern simulation only handles boolean gates, not {}'.format(
+                    component.name, type(component).__name__))
+            self.gates.append(Gate(component))
+        self.signals = {}
+        self.drivers = set()
+        for point in self.netlist.points:
+            self._add(point)
+        for gate in self.gates:
+            for point in gate.component.points():
+                self._add(point)
+
+    def _add(self, point):
+        if point not in self.signals:
+            self.signals[point] = [ signal(x, self.full) for x in point.value ]
+            if point.direction == OUT:
+                self.drivers.add(point)
+
+    # Stimulus, one integer per bit of the point, bit k being the bit under
+    # pattern k. Equivalent to point.OUT() for every pattern.
+    def set(self, point, *planes):
+        self._add(point)
+        assert len(planes) == len(self.signals[point])
+        self.signals[point] = [ (plane & self.full, 0, 0) for plane in planes ]
+        self.drivers.add(point)
+        return self
+
+    # Stimulus given as one value per pattern, in any state
+    def assign(self, point, values):
+        self._add(point)
+        width = len(self.signals[point])
+        planes = [ [ 0, 0, 0 ] for n in range(width) ]
+        for k, x in enumerate(values):
+            assert len(x) == width
+            for bit, symbol in zip(planes, x):
+                for n, plane in enumerate(STATES[symbol]):
+                    bit[n] |= plane << k
+        self.signals[point] = [ tuple(bit) for bit in planes ]
+        self.drivers.add(point)
+        return self
+
+    def exhaustive(self, *points):
+        n = sum(len(point.value) for point in points)
+        assert self.count == 2**n, 'Exhaustive patterns need {} patterns, not {}'.format(2**n, self.count)
+        i = 0
+        for point in points:
+            width = len(point.value)
+            self.set(point, *( exhaustive_plane(i + j, n) for j in range(width) ))
+            i += width
+        return self
+
+    def get(self, point):
+        return self.signals[point]
+
+    def value(self, point, k):
+        return value(*( symbol_at(s, k) for s in self.signals[point] ))
+
+    def is_binary(self, point):
+        return not any(s[1] for s in self.signals[point])
+
+    ############################################################################
+
+    def generation(self):
+        changed = False
+        for gate in self.gates:
+            c = gate.component
+            out = [
+                gate.evaluate(inputs, self.full)
+                for inputs in zip(*( self.signals[p] for p in c.inputs ))
+            ]
+            if out != self.signals[c.output]:
+                self.signals[c.output] = out
+                changed = True
+        return changed
+
+    def propagation(self):
+        changed = False
+        for net in self.netlist.nets:
+            drivers = [ p for p in net if p in self.drivers ]
+            readers = [ p for p in net if p not in self.drivers and p.direction == IN ]
+            if len(readers) == 0:
+                continue
+            width = len(self.signals[readers[0]])
+            if len(drivers) == 0:
+                out = [ signal(FLOATING, self.full) ] * width
+            elif len(drivers) == 1:
+                out = self.signals[drivers[0]]
+            else:
+                out = [ signal(CONFLICT, self.full) ] * width
+            for p in readers:
+                if self.signals[p] != out:
+                    self.signals[p] = out
+                    changed = True
+        return changed
+
+    def iteration(self):
+        changed = self.generation()
+        changed = self.propagation() or changed
+        return not changed
+
+    def step(self, *, limit=100):
+        n = 0
+        while not self.iteration() and n < limit:
+            n += 1
+        return (n < limit, n)
@@ -2,24 +2,101 @@ from .value import *
 
 ################################################################################
 
-IN = 'in'
-OUT = 'out'
-HiZ = 'hiZ'
+IN = 0
+OUT = 1
+HiZ = 2
+DIRECTIONS = ('in', 'out', 'hiZ')
+
+################################################################################
+
+# Hierarchical name of a point or sub-component, resolved from its parent on
+# demand rather than concatenated for every point up front.
+class Name:
+    __slots__ = ('parent', 'name')
+
+    def __init__(self, parent, name):
+        self.parent = parent
+        self.name = name
+
+    def __str__(self):
+        return '{}.{}'.format(self.parent.name, self.name)
+
+################################################################################
+
+# Every change of a point value or direction is counted, and the point stamped
+# with the count. Changes are also recorded in the open journal, if any. This
+# lives apart from the point classes: writing class attributes on every change
+# would defeat the interpreter's attribute caches for all points.
+class Tracking:
+    __slots__ = ('last_stamp', 'journal')
+
+    def __init__(self):
+        self.last_stamp = 0
+        self.journal = None
+
+tracking = Tracking()
+
+# Points changed while a journal is open, with their value from before their
+# first change. Journals nest: closing one hands its changes to the outer one.
+class Journal(dict):
+    def __enter__(self):
+        self._outer = tracking.journal
+        tracking.journal = self
+        return self
+
+    def __exit__(self, *exception):
+        tracking.journal = self._outer
+        if self._outer is not None:
+            for point, value in self.items():
+                self._outer.setdefault(point, value)
+        return False
+
+    def changed(self):
+        return [ point for point, value in self.items() if point.value != value ]
 
 ################################################################################
 
 class BasePoint:
+    __slots__ = ('_parent', '_local_name', 'value', 'direction', 'stamp')
+
     def __init__(self, name):
         self.name = name
         self.value = None
         self.direction = None
+        self.stamp = 0
+
+    @property
+    def name(self):
+        if self._parent is None:
+            return self._local_name
+        return '{}.{}'.format(self._parent.name, self._local_name)
+
+    @name.setter
+    def name(self, name):
+        if isinstance(name, Name):
+            self._parent = name.parent
+            self._local_name = name.name
+        else:
+            self._parent = None
+            self._local_name = name
+
+    def _changing(self):
+        tracking.last_stamp += 1
+        self.stamp = tracking.last_stamp
+        journal = tracking.journal
+        if journal is not None and self not in journal:
+            journal[self] = self.value
 
     def _set_value(self, value):
-        self.value = value
+        if value != self.value:
+            self._changing()
+            self.value = value
         return self
     
     def _set_direction(self, direction):
-        self.direction = direction
+        if direction != self.direction:
+            self._changing()
+            self.direction = direction
         return self
 
     def IN(self): return self._set_direction(IN)
@@ -36,11 +113,13 @@ class BasePoint:
     
     def __repr__(self):
         value = ''.join(( str(x) for x in self.value ))
-        return '<{}> {} {}'.format(self.name, self.direction, value)
+        return '<{}> {} {}'.format(self.name, DIRECTIONS[self.direction], value)
 
 ################################################################################
 
 class Point(BasePoint):
+    __slots__ = ()
+
     def __init__(self, name):
         super().__init__(name)
         self.IN().set(value_floating())
@@ -52,15 +131,18 @@ class Point(BasePoint):
 ################################################################################
 
 class WidePoint(BasePoint):
+    __slots__ = ('width',)
+
     def __init__(self, name, width):
         super().__init__(name)
         self.width = width
         self.IN().set(value_floating(self.width))
 
     def _set_value(self, value):
-        if value == value_floating():
-            value = value_floating(self.width)
-        assert self.width == len(value), '{}: Invalid data width, expected {}, received {}'.format(self.name, self.width, value)
+        if len(value) != self.width:
+            if value == value_floating():
+                value = value_floating(self.width)
+            assert self.width == len(value), '{}: Invalid data width, expected {}, received {}'.format(self.name, self.width, value)
         super()._set_value(value)
         return self
 
@@ -71,18 +153,22 @@ class WidePoint(BasePoint):
 ################################################################################
 
 class SignalPoint(WidePoint):
+    __slots__ = ()
+
     def __init__(self, name):
         super().__init__(name, 1)
     
     def is_high(self):
-        return self.get() == value_high()
+        return self.get()[0] == HIGH
     
     def is_low(self):
-        return self.get() == value_low()
+        return self.get()[0] == LOW
 
 ################################################################################
 
 class TriggerPoint(SignalPoint):
+    __slots__ = ('_was_low',)
+
     def __init__(self, name):
         super().__init__(name)
         self._was_low = False
@@ -0,0 +1,136 @@
+from array import array
+from collections import Counter
+from time import perf_counter
+
+from .circuit import resolve
+from .points import tracking
+
+################################################################################
+
+# Opt-in profiling of the steps of a circuit. Nothing is checked in the
+# engines: while enabled, the profiler shadows generate() on every active
+# component and _step() on the circuit with timed versions, and gives the
+# netlist a counting resolve() for its nets. Disabling puts the originals
+# back. Only one profiler can be enabled on a circuit at a time.
+# Levelized programs do not call generate(), their gates are not timed.
+
+class Profiler:
+    def __init__(self, circuit):
+        self.circuit = circuit
+        self.calls = Counter()
+        self.times = Counter()
+        self.resolutions = Counter()
+        self.changes = Counter()
+        self.iterations = array('I')
+        self.settled = 0
+        self.step_time = 0.0
+        self._components = []
+        self._netlist = None
+
+    def enable(self):
+        assert self._netlist is None, 'Profiler already enabled'
+        netlist = self.circuit.netlist()
+        # The timed versions would wrap the ones of the other profiler
+        assert netlist.resolve is None and '_step' not in vars(self.circuit) and not any(
+            'generate' in vars(c) for c in netlist.active), 'Another profiler enabled on the circuit'
+        self._netlist = netlist
+        self._components = list(netlist.active)
+        for component in self._components:
+            component.generate = self._timed(component, component.generate)
+        self.circuit._step = self._timed_step(self.circuit._step)
+        netlist.resolve = self._counted(resolve)
+        return self
+
+    def disable(self):
+        if self._netlist is None:
+            return self
+        for component in self._components:
+            del component.generate
+        del self.circuit._step
+        self._netlist.resolve = None
+        self._netlist = None
+        self._components = []
+        return self
+
+    def __enter__(self):
+        return self.enable()
+
+    def __exit__(self, *exception):
+        self.disable()
+        return False
+
+    ############################################################################
+
+    def _timed(self, component, generate):
+        calls = self.calls
+        times = self.times
+        def timed_generate():
+            start = perf_counter()
+            generate()
+            times[component] += perf_counter() - start
+            calls[component] += 1
+        return timed_generate
+
+    def _timed_step(self, step):
+        def timed_step(limit, engine):
+            start = perf_counter()
+            settled, n = step(limit, engine)
+            self.step_time += perf_counter() - start
+            self.iterations.append(n + 1)
+            self.settled += settled
+            return (settled, n)
+        return timed_step
+
+    def _counted(self, resolve):
+        resolutions = self.resolutions
+        changes = self.changes
+        def counted_resolve(net):
+            stamp = tracking.last_stamp
+            resolve(net)
+            resolutions[net] += 1
+            if tracking.last_stamp != stamp:
+                changes[net] += 1
+        return counted_resolve
+
+    ############################################################################
+
+    def by_class(self):
+        calls = Counter()
+        times = Counter()
+        for component, n in self.calls.items():
+            calls[type(component).__name__] += n
+            times[type(component).__name__] += self.times[component]
+        return calls, times
+
+    def report(self, top=10):
+        steps = len(self.iterations)
+        lines = []
+        if steps > 0:
+            lines.append('{} steps, {} settled, {:.3f} s, iterations per step: mean {:.2f}, max {}'.format(
+                steps, self.settled, self.step_time, sum(self.iterations) / steps, max(self.iterations)))
+
+        def table(title, calls, times):
+            lines.append('')
+            lines.append('{:<48} {:>10} {:>10} {:>10}'.format(title, 'calls', 'self s', 'us/call'))
+            for key, time in times.most_common(top):
+                lines.append('{:<48} {:>10} {:>10.4f} {:>10.2f}'.format(
+                    key, calls[key], time, 1e6 * time / calls[key]))
+
+        calls, times = self.by_class()
+        table('class', calls, times)
+        def named(counter):
+            # Components with the same name add up
+            result = Counter()
+            for component, n in counter.items():
+                result[component.name] += n
+            return result
+        table('component', named(self.calls), named(self.times))
+
+        lines.append('')
+        lines.append('{:<48} {:>10} {:>10}'.format('net', 'resolved', 'changed'))
+        for net, n in self.resolutions.most_common(top):
+            name = ', '.join(sorted(p.name for p in net))
+            if len(name) > 48:
+                name = name[:45] + '...'
+            lines.append('{:<48} {:>10} {:>10}'.format(name, n, self.changes[net]))
+        return '\n'.join(lines)
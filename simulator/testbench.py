@@ -0,0 +1,294 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+
+from .circuit import SWEEP
+from .points import Journal
+from .value import *
+
+################################################################################
+
+# Asyncio testbenches: stimulus and monitor tasks are coroutines awaiting
+# events of the circuit, such as rising_edge(point), value_equals(bus, n) or
+# cycles(n). The scheduler lets every task run until all of them wait, then
+# advances the simulation only as far as needed to wake one: it settles what
+# the tasks drove, then drives the clock, if any, one phase at a time.
+#
+# Waiters are indexed by the points they watch, and only looked at when one
+# of those points changed. Tasks must only wait on testbench events and on
+# each other with join(), which the scheduler can account for.
+
+_current = contextvars.ContextVar('testbench', default=None)
+
+def current():
+    bench = _current.get()
+    if bench is None:
+        raise RuntimeError('No testbench running')
+    return bench
+
+class Trigger:
+    def __await__(self):
+        return current()._wait(self).__await__()
+
+    # Called when waiting starts, to record the state to compare with
+    def arm(self):
+        pass
+
+    def register(self, bench, entry):
+        pass
+
+    # Whether the trigger fired, after a settled step
+    def check(self):
+        return True
+
+class PointTrigger(Trigger):
+    # Level triggers are checked at the next settled step even without a
+    # change, edge triggers wait for one
+    level = False
+
+    def __init__(self, point):
+        self.point = point
+
+    def register(self, bench, entry):
+        self.arm()
+        bench._watch.setdefault(self.point, []).append(entry)
+        if self.level:
+            bench._fresh.append(entry)
+
+class RisingEdge(PointTrigger):
+    def __init__(self, point):
+        assert len(point.value) == 1, '{}: edges of single bits only'.format(point.name)
+        super().__init__(point)
+
+    def arm(self):
+        self.last = self.point.value[0]
+
+    def check(self):
+        last = self.last
+        self.last = self.point.value[0]
+        return last == LOW and self.last == HIGH
+
+class FallingEdge(RisingEdge):
+    def check(self):
+        last = self.last
+        self.last = self.point.value[0]
+        return last == HIGH and self.last == LOW
+
+class Changed(PointTrigger):
+    def arm(self):
+        self.last = self.point.value
+
+    def check(self):
+        return self.point.value != self.last
+
+class ValueEquals(PointTrigger):
+    level = True
+
+    def __init__(self, point, expected):
+        super().__init__(point)
+        if isinstance(expected, int):
+            expected = int_to_value(expected, len(point.value))
+        self.expected = expected
+
+    def check(self):
+        return self.point.value == self.expected
+
+class Cycles(Trigger):
+    def __init__(self, n):
+        assert n >= 0
+        self.n = n
+
+    def register(self, bench, entry):
+        if self.n == 0:
+            bench._fresh.append(entry)
+        else:
+            assert bench.clock is not None, 'Waiting for cycles without a clock'
+            heapq.heappush(bench._timers, (bench.cycle + self.n, next(bench._sequence), entry))
+
+class Join(Trigger):
+    def __init__(self, task):
+        self.task = task
+
+    def register(self, bench, entry):
+        if self.task.done():
+            bench._fresh.append(entry)
+        else:
+            bench._joins.setdefault(self.task, []).append(entry)
+
+# The first of several triggers to fire, which is the result of waiting
+class First(Trigger):
+    def __init__(self, *triggers):
+        self.triggers = triggers
+
+    def register(self, bench, entry):
+        trigger, future, result = entry
+        for child in self.triggers:
+            child.register(bench, (child, future, child))
+
+def rising_edge(point):
+    return RisingEdge(point)
+
+def falling_edge(point):
+    return FallingEdge(point)
+
+def changed(point):
+    return Changed(point)
+
+def value_equals(point, expected):
+    return ValueEquals(point, expected)
+
+def cycles(n):
+    return Cycles(n)
+
+def join(task):
+    return Join(task)
+
+def first(*triggers):
+    return First(*triggers)
+
+def start(coroutine):
+    return current().start(coroutine)
+
+################################################################################
+
+class Testbench:
+    # Rounds of the event loop that tasks can run without any testbench
+    # event, before they are taken for waiting on something else
+    IDLE_ROUNDS = 1000
+
+    def __init__(self, circuit, clock=None, *, engine=SWEEP, limit=100):
+        self.circuit = circuit
+        self.clock = clock
+        self.engine = engine
+        self.limit = limit
+        self.cycle = 0
+        self.steps = 0
+        self.runnable = 0
+        self._tasks = []
+        self._watch = {}
+        self._fresh = []
+        self._timers = []
+        self._joins = {}
+        self._sequence = itertools.count()
+        self._activity = 0
+        self._loop = None
+
+    def start(self, coroutine):
+        task = self._loop.create_task(self._track(coroutine))
+        self._tasks.append(task)
+        self.runnable += 1
+        return task
+
+    async def _track(self, coroutine):
+        try:
+            return await coroutine
+        finally:
+            # Joining tasks are runnable before this one stops being
+            for entry in self._joins.pop(asyncio.current_task(), []):
+                self._resolve(entry)
+            self.runnable -= 1
+            self._activity += 1
+
+    def _wait(self, trigger):
+        future = self._loop.create_future()
+        trigger.register(self, (trigger, future, None))
+        self.runnable -= 1
+        self._activity += 1
+        return future
+
+    def _resolve(self, entry):
+        trigger, future, result = entry
+        if not future.done():
+            future.set_result(result)
+            self.runnable += 1
+            self._activity += 1
+
+    ############################################################################
+
+    # Runs main, and any task it starts, until main returns. Other tasks are
+    # cancelled then. Cycles limits the clock cycles run.
+    def run(self, main, *, cycles=None):
+        return asyncio.run(self.run_async(main, cycles=cycles))
+
+    async def run_async(self, main, *, cycles=None):
+        self._loop = asyncio.get_running_loop()
+        token = _current.set(self)
+        try:
+            task = self.start(main)
+            while True:
+                stimulus = await self._idle()
+                for t in self._tasks:
+                    if t.done() and not t.cancelled() and t.exception() is not None:
+                        raise t.exception()
+                if task.done():
+                    return task.result()
+                self._advance(stimulus, cycles)
+        finally:
+            for t in self._tasks:
+                t.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            _current.reset(token)
+
+    async def _idle(self):
+        # Lets the tasks run until all of them wait, and returns the points
+        # they changed
+        with Journal() as journal:
+            rounds = 0
+            activity = self._activity
+            while self.runnable > 0:
+                await asyncio.sleep(0)
+                if self._activity != activity:
+                    rounds = 0
+                    activity = self._activity
+                rounds += 1
+                if rounds > self.IDLE_ROUNDS:
+                    raise RuntimeError('Testbench tasks waiting on something else than testbench events')
+        return set(journal.changed())
+
+    def _advance(self, stimulus, cycles):
+        changed = stimulus
+        if len(changed) > 0:
+            self.circuit.step(limit=self.limit, engine=self.engine)
+            self.steps += 1
+            changed |= self.circuit.changed
+        while not self._check(changed):
+            if self.clock is None:
+                raise RuntimeError('Testbench stuck: tasks waiting, and nothing left to change without a clock')
+            if cycles is not None and self.cycle >= cycles:
+                raise TimeoutError('Testbench still waiting after {} cycles'.format(cycles))
+            changed = self._tick()
+
+    def _tick(self):
+        # One phase of the clock, a cycle ending on the high phase
+        high = self.clock.value[0] != HIGH
+        self.clock.OUT(value_high() if high else value_low())
+        self.circuit.step(limit=self.limit, engine=self.engine)
+        self.steps += 1
+        if high:
+            self.cycle += 1
+            while len(self._timers) > 0 and self._timers[0][0] <= self.cycle:
+                self._fresh.append(heapq.heappop(self._timers)[2])
+        return { self.clock } | self.circuit.changed
+
+    def _check(self, changed):
+        # Wakes the waiters whose trigger fired, and tells if any did
+        woken = self.runnable
+        entries, self._fresh = self._fresh, []
+        for point in changed:
+            watching = self._watch.pop(point, None)
+            if watching is not None:
+                entries += watching
+        waiting = []
+        for entry in entries:
+            trigger, future, result = entry
+            if future.done():
+                continue
+            if trigger.check():
+                self._resolve(entry)
+            elif isinstance(trigger, PointTrigger):
+                waiting.append(entry)
+        for entry in waiting:
+            if not entry[1].done():
+                self._watch.setdefault(entry[0].point, []).append(entry)
+        return self.runnable > woken
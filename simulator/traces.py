@@ -0,0 +1,212 @@
+import json
+import os
+from array import array
+
+import numpy as np
+
+from .batch import CODES
+from .components.components import collect_points
+from .value import *
+
+################################################################################
+
+# Columnar trace store: every traced point gets two fixed width columns, one
+# sample per step, appended to raw files a chunk at a time:
+#   - values: the bits of the point as an unsigned integer, non-binary bits
+#     reading as 0,
+#   - states: 0 when the value is binary, otherwise the batch code of its first
+#     non-binary bit.
+# A meta.json file describes the columns. Traces reads them back through
+# numpy.memmap, without copying.
+
+META = 'meta.json'
+
+def column_type(width):
+    assert 0 < width <= 64, 'Cannot trace {} bits wide points'.format(width)
+    for typecode in 'BHILQ':
+        if 8 * array(typecode).itemsize >= width:
+            return typecode
+
+def encode(value):
+    if isinstance(value, Packed):
+        if value.is_binary():
+            return (value.bits, 0)
+        value = unpack(value)
+    bits = 0
+    state = 0
+    for x in value:
+        bits <<= 1
+        if x == HIGH:
+            bits |= 1
+        elif x != LOW and state == 0:
+            state = CODES[x]
+    return (bits, state)
+
+################################################################################
+
+class Column:
+    __slots__ = ('point', 'name', 'width', 'values', 'states', 'stamp', 'last')
+
+    def __init__(self, point, name):
+        self.point = point
+        self.name = name
+        self.width = len(point.value)
+        self.values = array(column_type(self.width))
+        self.states = array('B')
+        self.stamp = None
+        self.last = None
+
+class TraceWriter:
+    def __init__(self, circuit, directory, *, chunk=1 << 16):
+        self.circuit = circuit
+        self.directory = directory
+        self.chunk = chunk
+        self.columns = []
+        self.steps = 0
+        self._pending = 0
+        os.makedirs(directory, exist_ok=True)
+        circuit.observe(self)
+
+    # Points, lists of points, or components with all their sub-components.
+    # Columns are fixed once the first step was recorded.
+    def trace(self, *targets):
+        assert self.steps == 0, 'Traced points are fixed once recording started'
+        names = { column.name for column in self.columns }
+        traced = { column.point for column in self.columns }
+        for point in collect_points(targets):
+            if point in traced:
+                continue
+            name = point.name
+            n = 1
+            while name in names:
+                name = '{}[{}]'.format(point.name, n)
+                n += 1
+            names.add(name)
+            traced.add(point)
+            column = Column(point, name)
+            self.columns.append(column)
+            for suffix in ('values', 'states'):
+                open(self._path(len(self.columns) - 1, suffix), 'wb').close()
+        self._write_meta()
+        return self
+
+    def _path(self, index, suffix):
+        return os.path.join(self.directory, '{}.{}'.format(index, suffix))
+
+    # Called by the circuit after every step. Points not stamped since their
+    # last sample repeat it without being encoded again.
+    def __call__(self, circuit):
+        for column in self.columns:
+            point = column.point
+            if point.stamp != column.stamp:
+                column.stamp = point.stamp
+                column.last = encode(point.value)
+            bits, state = column.last
+            column.values.append(bits)
+            column.states.append(state)
+        self.steps += 1
+        self._pending += 1
+        if self._pending >= self.chunk:
+            self.flush()
+
+    def flush(self):
+        for index, column in enumerate(self.columns):
+            with open(self._path(index, 'values'), 'ab') as file:
+                column.values.tofile(file)
+            with open(self._path(index, 'states'), 'ab') as file:
+                column.states.tofile(file)
+            del column.values[:]
+            del column.states[:]
+        self._pending = 0
+        self._write_meta()
+
+    def _write_meta(self):
+        meta = {
+            'steps': self.steps - self._pending,
+            'columns': [
+                { 'name': column.name, 'width': column.width, 'dtype': 'u{}'.format(column.values.itemsize) }
+                for column in self.columns
+            ],
+        }
+        with open(os.path.join(self.directory, META), 'w') as file:
+            json.dump(meta, file, indent=1)
+
+    def close(self):
+        self.circuit.unobserve(self)
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+        return False
+
+################################################################################
+
+class Traces:
+    def __init__(self, directory):
+        with open(os.path.join(directory, META)) as file:
+            meta = json.load(file)
+        self.steps = meta['steps']
+        self.widths = {}
+        self._values = {}
+        self._states = {}
+        for index, column in enumerate(meta['columns']):
+            name = column['name']
+            self.widths[name] = column['width']
+            self._values[name] = self._map(directory, index, 'values', column['dtype'])
+            self._states[name] = self._map(directory, index, 'states', 'u1')
+
+    def _map(self, directory, index, suffix, dtype):
+        # Empty files cannot be mapped
+        if self.steps == 0:
+            return np.zeros(0, dtype=dtype)
+        path = os.path.join(directory, '{}.{}'.format(index, suffix))
+        return np.memmap(path, dtype=dtype, mode='r', shape=(self.steps,))
+
+    def names(self):
+        return list(self.widths)
+
+    def values(self, name, start=0, stop=None):
+        return self._values[name][start:stop]
+
+    def states(self, name, start=0, stop=None):
+        return self._states[name][start:stop]
+
+    def binary(self, name, start=0, stop=None):
+        return self.states(name, start, stop) == 0
+
+    def value(self, name, step):
+        state = self._states[name][step]
+        if state == 0:
+            return int_to_value(int(self._values[name][step]), self.widths[name])
+        return None
+
+    # Steps in [start, stop) where the point holds the binary value n, or
+    # where predicate(values) holds on the binary samples
+    def where(self, name, n=None, *, predicate=None, start=0, stop=None):
+        values = self.values(name, start, stop)
+        mask = self.binary(name, start, stop)
+        if n is not None:
+            mask &= values == n
+        if predicate is not None:
+            mask &= predicate(values)
+        return np.flatnonzero(mask) + start
+
+    def first(self, name, n=None, *, predicate=None, start=0, stop=None):
+        steps = self.where(name, n, predicate=predicate, start=start, stop=stop)
+        return int(steps[0]) if len(steps) > 0 else None
+
+    # Steps in [start, stop) where the sample differs from the one before
+    def changes(self, name, start=0, stop=None):
+        values = self.values(name, start, stop)
+        states = self.states(name, start, stop)
+        changed = (values[1:] != values[:-1]) | (states[1:] != states[:-1])
+        return np.flatnonzero(changed) + start + 1
+
+    # Counts of the binary values taken in [start, stop)
+    def histogram(self, name, start=0, stop=None):
+        values = self.values(name, start, stop)[self.binary(name, start, stop)]
+        keys, counts = np.unique(values, return_counts=True)
+        return { int(k): int(c) for k, c in zip(keys, counts) }
@@ -26,12 +26,108 @@ def value_conflict(width = 1):
 def value_undecided(width = 1):
     return [ UNDECIDED ] * width
 
+_BITS = { LOW: 0, HIGH: 1 }
+
 def value_to_int(value):
-    n = ''.join([ str(x) for x in value ])
-    return int(n, base=2)
+    if isinstance(value, Packed):
+        if not value.is_binary():
+            raise ValueError('Not a binary value: {}'.format(value))
+        return value.bits
+    n = 0
+    try:
+        for x in value:
+            n = (n << 1) | _BITS[x]
+    except KeyError:
+        raise ValueError('Not a binary value: {}'.format(value)) from None
+    return n
 
 def int_to_value(n, width):
     n = n % 2**width
-    n = '{:0{}b}'.format(n, width)
-    n = [ int(x) for x in n ]
-    return value(*n)
+    return [ (n >> i) & 1 for i in range(width - 1, -1, -1) ]
+
+################################################################################
+
+# Packed form of a value: one integer bit-plane for the binary value, and one
+# per non-binary state. Bit 0 of each plane is the last element of the list
+# form, so that the value plane reads as the same integer as value_to_int.
+class Packed:
+    __slots__ = ('width', 'bits', 'floating', 'hi_z', 'conflict', 'undecided')
+
+    def __init__(self, width, bits=0, floating=0, hi_z=0, conflict=0, undecided=0):
+        self.width = width
+        self.bits = bits
+        self.floating = floating
+        self.hi_z = hi_z
+        self.conflict = conflict
+        self.undecided = undecided
+
+    def planes(self):
+        return (self.bits, self.floating, self.hi_z, self.conflict, self.undecided)
+
+    def unknown(self):
+        return self.floating | self.hi_z | self.conflict | self.undecided
+
+    def is_binary(self):
+        return not (self.floating or self.hi_z or self.conflict or self.undecided)
+
+    def _symbol(self, bit):
+        mask = 1 << bit
+        if self.bits & mask: return HIGH
+        if self.floating & mask: return FLOATING
+        if self.hi_z & mask: return HI_Z
+        if self.conflict & mask: return CONFLICT
+        if self.undecided & mask: return UNDECIDED
+        return LOW
+
+    def __len__(self):
+        return self.width
+
+    def __iter__(self):
+        if self.is_binary():
+            bits = self.bits
+            return ( (bits >> i) & 1 for i in range(self.width - 1, -1, -1) )
+        return ( self._symbol(i) for i in range(self.width - 1, -1, -1) )
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index += self.width
+        if not 0 <= index < self.width:
+            raise IndexError('Packed index out of range')
+        return self._symbol(self.width - 1 - index)
+
+    def __eq__(self, other):
+        if not isinstance(other, Packed):
+            if not isinstance(other, (list, tuple)):
+                return NotImplemented
+            try:
+                other = pack(other)
+            except KeyError:
+                return False
+        return self.width == other.width and self.planes() == other.planes()
+
+    def __hash__(self):
+        return hash((self.width,) + self.planes())
+
+    def __repr__(self):
+        return 'Packed({})'.format(''.join(( str(x) for x in self )))
+
+_PLANES = { HIGH: 0, FLOATING: 1, HI_Z: 2, CONFLICT: 3, UNDECIDED: 4 }
+
+def pack(value):
+    if isinstance(value, Packed):
+        return value
+    planes = [ 0 ] * 5
+    bit = 1 << len(value)
+    for x in value:
+        bit >>= 1
+        if x != LOW:
+            planes[_PLANES[x]] |= bit
+    return Packed(len(value), *planes)
+
+def unpack(value):
+    return list(value)
+
+def int_to_packed(n, width):
+    return Packed(width, n % 2**width)
@@ -0,0 +1,136 @@
+from .components.components import collect_points
+from .points import tracking
+from .value import *
+
+################################################################################
+
+# Value change dump of selected points: observes a circuit, and after every
+# settled step writes the traced points whose value changed, each step being
+# one unit of time. Output goes through a large write buffer, so memory stays
+# constant however long the run.
+
+SYMBOLS = {
+    LOW: '0',
+    HIGH: '1',
+    FLOATING: 'z',
+    HI_Z: 'z',
+    CONFLICT: 'x',
+    UNDECIDED: 'x',
+}
+
+def identifier(n):
+    # Printable ASCII, '!' to '~'
+    chars = []
+    while True:
+        chars.append(chr(33 + n % 94))
+        n //= 94
+        if n == 0:
+            return ''.join(chars)
+
+def vcd_value(value, ident):
+    if len(value) == 1:
+        return SYMBOLS[value[0]] + ident
+    if isinstance(value, Packed) and value.is_binary():
+        bits = format(value.bits, '0{}b'.format(value.width))
+    else:
+        bits = ''.join(SYMBOLS[x] for x in value)
+    return 'b{} {}'.format(bits, ident)
+
+################################################################################
+
+class Tracer:
+    def __init__(self, circuit, file, *, timescale='1ns', buffering=1 << 20):
+        self.circuit = circuit
+        self.timescale = timescale
+        if isinstance(file, str):
+            self.file = open(file, 'w', buffering=buffering)
+            self._owned = True
+        else:
+            self.file = file
+            self._owned = False
+        self.points = []
+        self.identifiers = {}
+        self.time = 0
+        self.stamp = None
+        self._entries = []
+        circuit.observe(self)
+
+    # Points, lists of points, or components with all their sub-components.
+    # Tracing must be set up before the first step.
+    def trace(self, *targets):
+        assert self.stamp is None, 'Traced points are fixed once the dump started'
+        for point in collect_points(targets):
+            if point not in self.identifiers:
+                self.identifiers[point] = identifier(len(self.points))
+                self.points.append(point)
+        return self
+
+    ############################################################################
+
+    def _header(self):
+        lines = [
+            '$timescale {} $end'.format(self.timescale),
+        ]
+        # Scopes follow the hierarchical names of the points
+        tree = {}
+        for point in self.points:
+            *scopes, name = point.name.split('.')
+            node = tree
+            for scope in scopes:
+                node = node.setdefault(scope, {})
+            node.setdefault(None, []).append((name, point))
+        def emit(name, node):
+            lines.append('$scope module {} $end'.format(_reference(name)))
+            for name, point in node.get(None, []):
+                lines.append('$var wire {} {} {} $end'.format(
+                    len(point.value), self.identifiers[point], _reference(name)))
+            for scope, child in node.items():
+                if scope is not None:
+                    emit(scope, child)
+            lines.append('$upscope $end')
+        emit(self.circuit.name, tree)
+        lines.append('$enddefinitions $end')
+        lines.append('#0')
+        lines.append('$dumpvars')
+        for point in self.points:
+            lines.append(vcd_value(point.value, self.identifiers[point]))
+        lines.append('$end')
+        self.file.write('\n'.join(lines) + '\n')
+        self._entries = [ [ point, self.identifiers[point], point.value ] for point in self.points ]
+        self.stamp = tracking.last_stamp
+
+    # Called by the circuit after every step
+    def __call__(self, circuit):
+        if self.stamp is None:
+            self._header()
+            return
+        self.time += 1
+        stamp = self.stamp
+        lines = None
+        for entry in self._entries:
+            point = entry[0]
+            if point.stamp > stamp and point.value != entry[2]:
+                if lines is None:
+                    lines = [ '#{}'.format(self.time) ]
+                entry[2] = point.value
+                lines.append(vcd_value(point.value, entry[1]))
+        if lines is not None:
+            self.file.write('\n'.join(lines) + '\n')
+        self.stamp = tracking.last_stamp
+
+    def close(self):
+        self.circuit.unobserve(self)
+        if self._owned:
+            self.file.close()
+        else:
+            self.file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+        return False
+
+def _reference(name):
+    return '_'.join(str(name).split()) or '_'
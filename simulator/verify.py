@@ -0,0 +1,163 @@
+import concurrent.futures
+import os
+
+from .points import IN, TriggerPoint
+from .value import *
+
+################################################################################
+
+# Exhaustive verification of a component against a golden model. The cases
+# are every combination of the choices of each axis: a pin of the component,
+# by attribute name, and the values to put on it:
+#   - WORDS: every integer fitting the width of the pin,
+#   - SIGNALS: LOW and HIGH,
+#   - CLOCKS: the TriggerPoint states LOW, HIGH and TRIGGERED,
+#   - or an explicit sequence of integers, values, symbols (put on every
+#     bit) or clock states.
+# Input pins are set, other pins (outputs holding a state) are driven. Cases
+# are numbered in mixed radix, so that chunks of cases are plain ranges that
+# worker processes can run without anything else to share.
+#
+# The model gets the case as a dict of choices by pin, and returns the
+# expected values by pin name after one generate(), as integers or values.
+# Pins holding a list of points expect a list.
+
+WORDS = 'WORDS'
+SIGNALS = (LOW, HIGH)
+CLOCKS = (TriggerPoint.LOW, TriggerPoint.HIGH, TriggerPoint.TRIGGERED)
+
+class Harness:
+    def __init__(self, factory, model, axes):
+        self.factory = factory
+        self.model = model
+        self.component = factory()
+        self.axes = []
+        for name, choices in axes.items():
+            pin = getattr(self.component, name)
+            if choices == WORDS:
+                choices = range(2**len(pin.value))
+            self.axes.append((name, pin, tuple(choices)))
+        self.cases = 1
+        for name, pin, choices in self.axes:
+            self.cases *= len(choices)
+        # Everything a case changes, to put back before the next one
+        self.points = list(self.component.points())
+        self.initial = [ (p, p.value, p.direction, getattr(p, '_was_low', None)) for p in self.points ]
+        self.state = self.component.save_state()
+
+    def case(self, number):
+        case = {}
+        for name, pin, choices in reversed(self.axes):
+            number, index = divmod(number, len(choices))
+            case[name] = choices[index]
+        return { name: case[name] for name, pin, choices in self.axes }
+
+    def _reset(self):
+        for p, value, direction, was_low in self.initial:
+            p.value = value
+            p.direction = direction
+            if was_low is not None:
+                p._was_low = was_low
+        self.component.load_state(self.state)
+
+    def _apply(self, case):
+        for name, pin, choices in self.axes:
+            choice = case[name]
+            if isinstance(pin, TriggerPoint) and choice in CLOCKS:
+                pin._test_set(choice)
+                continue
+            if isinstance(choice, int):
+                value = int_to_packed(choice, len(pin.value))
+            elif isinstance(choice, (list, tuple, Packed)):
+                value = choice
+            else:
+                # Any other symbol on every bit
+                value = [ choice ] * len(pin.value)
+            if pin.direction == IN:
+                pin.set(value)
+            else:
+                pin.OUT(value)
+
+    def _compare(self, name, expected):
+        pin = getattr(self.component, name)
+        if isinstance(pin, list):
+            return [ (p.name, e, p.get()) for p, e in zip(pin, expected) if not _matches(p, e) ]
+        return [] if _matches(pin, expected) else [ (pin.name, expected, pin.get()) ]
+
+    # Mismatches of the cases in [start, stop), as (case number, pin name,
+    # expected, actual), up to limit
+    def run(self, start, stop, limit=None):
+        mismatches = []
+        for number in range(start, stop):
+            case = self.case(number)
+            self._reset()
+            self._apply(case)
+            self.component.generate()
+            for name, expected in self.model(case).items():
+                for pin_name, e, actual in self._compare(name, expected):
+                    mismatches.append((number, pin_name, e, actual))
+            if limit is not None and len(mismatches) >= limit:
+                break
+        return mismatches
+
+def _matches(pin, expected):
+    if isinstance(expected, int):
+        expected = int_to_value(expected, len(pin.value))
+    return pin.get() == expected
+
+################################################################################
+
+_harness = None
+
+def _start_worker(factory, model, axes):
+    global _harness
+    _harness = Harness(factory, model, axes)
+
+def _run(chunk):
+    start, stop, limit = chunk
+    return _harness.run(start, stop, limit)
+
+class Result:
+    def __init__(self, harness, cases, mismatches):
+        self.harness = harness
+        self.cases = cases
+        self.mismatches = mismatches
+
+    @property
+    def ok(self):
+        return len(self.mismatches) == 0
+
+    def describe(self):
+        lines = [ '{} cases, {} mismatches'.format(self.cases, len(self.mismatches)) ]
+        for number, name, expected, actual in self.mismatches:
+            case = ', '.join('{}={}'.format(k, v) for k, v in self.harness.case(number).items())
+            lines.append('  case {} ({}): {} expected {}, got {}'.format(number, case, name, expected, actual))
+        return '\n'.join(lines)
+
+# Runs every case, in chunks of cases spread over a pool of worker processes
+# (0 to run in this process), and returns the first mismatches found, up to
+# limit, or all of them with limit=None. Factory and model must be
+# picklable, i.e. module level functions, classes or functools.partial of
+# them.
+def verify(factory, model, axes, *, workers=None, chunk=4096, limit=10):
+    harness = Harness(factory, model, axes)
+    chunks = [ (start, min(start + chunk, harness.cases), limit) for start in range(0, harness.cases, chunk) ]
+    mismatches = []
+    full = lambda: limit is not None and len(mismatches) >= limit
+    if workers == 0:
+        for start, stop, _ in chunks:
+            mismatches += harness.run(start, stop, None if limit is None else limit - len(mismatches))
+            if full():
+                break
+    else:
+        pool = concurrent.futures.ProcessPoolExecutor(
+            workers or os.cpu_count() or 1, initializer=_start_worker, initargs=(factory, model, axes))
+        try:
+            # In order, to report the first mismatches
+            for found in pool.map(_run, chunks):
+                mismatches += found
+                if full():
+                    break
+        finally:
+            pool.shutdown(cancel_futures=True)
+    return Result(harness, harness.cases, mismatches[:limit])
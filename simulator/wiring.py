@@ -5,8 +5,48 @@ from .points import BasePoint
 ################################################################################
 
 class Wiring:
+    # Bumped whenever any wiring changes, so that compiled netlists can skip
+    # checking their own wirings one by one when nothing changed at all.
+    last_revision = 0
+
     def __init__(self):
         self.connections = defaultdict(set)
+        self.revision = 0
+        # Union-find over the connected points: each net is represented by a
+        # root point, which owns the set of the net members.
+        self._parent = {}
+        self._members = {}
+    
+    def touch(self):
+        Wiring.last_revision += 1
+        self.revision = Wiring.last_revision
+        return self
+    
+    def _root(self, point):
+        parent = self._parent
+        while parent[point] is not point:
+            parent[point] = parent[parent[point]]
+            point = parent[point]
+        return point
+    
+    def _union(self, point_a, point_b):
+        for point in (point_a, point_b):
+            if point not in self._parent:
+                self._parent[point] = point
+                self._members[point] = { point }
+        root_a = self._root(point_a)
+        root_b = self._root(point_b)
+        if root_a is not root_b:
+            if len(self._members[root_a]) < len(self._members[root_b]):
+                root_a, root_b = root_b, root_a
+            self._parent[root_b] = root_a
+            self._members[root_a] |= self._members.pop(root_b)
+    
+    def _split(self, points):
+        root = next(iter(points))
+        for point in points:
+            self._parent[point] = root
+        self._members[root] = points
     
     def connect(self, point_a, point_b):
         assert isinstance(point_a, BasePoint)
@@ -15,26 +55,50 @@ class Wiring:
         self.connections[point_a].add(point_b)
         self.connections[point_b].add(point_b)
         self.connections[point_b].add(point_a)
-        return self
+        self._union(point_a, point_b)
+        return self.touch()
     
     def disconnect(self, point_a, point_b):
         assert isinstance(point_a, BasePoint)
         assert isinstance(point_b, BasePoint)
         self.connections[point_a].remove(point_b)
         self.connections[point_b].remove(point_a)
-        return self
+        # Only the net that lost a connection is rebuilt, and only when it
+        # actually got split in two.
+        reached = self._reachable(point_a)
+        if point_b not in reached:
+            members = self._members.pop(self._root(point_a))
+            self._split(reached)
+            self._split(members - reached)
+        return self.touch()
+    
+    def merge(self, wiring):
+        for point, connections in wiring.connections.items():
+            self.connections[point] |= connections
+            for other in connections:
+                self._union(point, other)
+        return self.touch()
+    
+    def _reachable(self, point):
+        reached = { point }
+        to_visit = [ point ]
+        while len(to_visit) > 0:
+            for other in self.connections[to_visit.pop()]:
+                if other not in reached:
+                    reached.add(other)
+                    to_visit.append(other)
+        return reached
     
     def points(self):
         return set(( point for point, connections in self.connections.items() if len(connections) > 0 ))
     
+    def net(self, point):
+        if point not in self._parent:
+            return { point }
+        return set(self._members[self._root(point)])
+    
+    def nets(self):
+        return ( set(members) for members in self._members.values() )
+    
     def neighbours(self, point):
-        neighbours = set()
-        visited = set()
-        to_visit = {point}
-        while len(to_visit) > 0:
-            visit = to_visit.pop()
-            neighbours.update(self.connections[visit])
-            visited.add(visit)
-            to_visit.update(self.connections[visit])
-            to_visit.difference_update(visited)
-        return neighbours - {point}
+        return self.net(point) - { point }
@@ -1,14 +1,30 @@
+import array
+import collections
+import functools
+import io
 import itertools
+import os
+import pickle
+import sys
+import tempfile
 import unittest
 
 from simulator.value import *
 from simulator.points import *
 from simulator.wiring import *
 from simulator.components.components import *
-from simulator.components import boolean, ic74, memory
+from simulator.components import boolean, ic74, memory, example
+from simulator import cache, checkpoint, design, faults, levelize, patterns, profile, testbench, vcd, verify
+from simulator.circuit import Circuit, SWEEP, EVENT, LEVELIZED, signature
 
 from simulator_1 import Buffer, Inverter
 
+try:
+    import numpy
+    from simulator import batch
+except ImportError:
+    numpy = None
+
 def test_signals():
     return [ value_low(), value_high() ]
 
@@ -18,6 +34,58 @@ def test_clocks():
 def test_inputs(width):
     return [ value(*x) for x in itertools.product([LOW, HIGH], repeat=width) ]
 
+class ValueTests(unittest.TestCase):
+    def test_int_conversions(self):
+        for width in [1, 4, 9]:
+            for n in range(2**width):
+                x = int_to_value(n, width)
+                self.assertEqual(value_to_int(x), n)
+                self.assertEqual(x, [ int(b) for b in '{:0{}b}'.format(n, width) ])
+                self.assertEqual(value_to_int(int_to_packed(n, width)), n)
+        self.assertEqual(int_to_value(-1, 3), value_high(3))
+        self.assertRaises(ValueError, value_to_int, value(HIGH, FLOATING))
+        self.assertRaises(ValueError, value_to_int, pack(value(HI_Z, LOW)))
+
+    def test_packed(self):
+        x = value(HIGH, LOW, FLOATING, HI_Z, CONFLICT, UNDECIDED, HIGH)
+        p = pack(x)
+        self.assertEqual(len(p), len(x))
+        self.assertEqual(unpack(p), x)
+        self.assertEqual(p, x)
+        self.assertEqual(x, p)
+        self.assertEqual(p[2], FLOATING)
+        self.assertEqual(p[-1], HIGH)
+        self.assertNotEqual(p, value_high(7))
+        self.assertFalse(p.is_binary())
+        self.assertEqual(pack(value(HIGH, LOW, HIGH)).bits, 5)
+        self.assertEqual(hash(pack(x)), hash(p))
+
+    def test_components_on_packed(self):
+        e = boolean.Xor()
+        for a, b in itertools.product(range(8), repeat=2):
+            e.a.set(int_to_packed(a, 3))
+            e.b.set(int_to_packed(b, 3))
+            e.generate()
+            self.assertIsInstance(e.output.get(), Packed)
+            self.assertEqual(e.output.get(), int_to_value(a ^ b, 3))
+        e.a.set(pack(value(FLOATING, HIGH, LOW)))
+        e.generate()
+        self.assertEqual(e.output.get(), value(UNDECIDED, LOW, HIGH))
+
+        counter = ic74.Counter_161(4)
+        counter.n_reset.set(value_high())
+        counter.n_ie.set(value_low())
+        counter.input.set(int_to_packed(14, 4))
+        counter.clock._test_set(TriggerPoint.TRIGGERED)
+        counter.generate()
+        counter.n_ie.set(value_high())
+        counter.cep.set(value_high())
+        counter.cet.set(value_high())
+        counter.clock._test_set(TriggerPoint.TRIGGERED)
+        counter.generate()
+        self.assertEqual(counter.output.get(), int_to_packed(15, 4))
+        self.assertTrue(counter.tc.is_high())
+
 class PointTests(unittest.TestCase):
     def test_set_value(self):
         v0 = value_low()
@@ -32,6 +100,15 @@ class PointTests(unittest.TestCase):
         p = Point('').HiZ().set(v1)
         self.assertEqual(p.value, value_hi_z())
 
+    def test_names(self):
+        fa = example.FullAdder('fa')
+        self.assertEqual(fa.a.name, 'fa.a')
+        self.assertEqual(fa._ha1._and.output.name, 'fa.HalfAdder.And.Y')
+        fa.name = 'adder'
+        self.assertEqual(fa._ha1._and.output.name, 'adder.HalfAdder.And.Y')
+        self.assertFalse(hasattr(fa.a, '__dict__'))
+        self.assertFalse(hasattr(ic74.Register_173(4).clock, '__dict__'))
+
 class WiringTests(unittest.TestCase):
     def test_simple_wires(self):
         a = Point('')
@@ -58,6 +135,830 @@ class WiringTests(unittest.TestCase):
         self.assertEqual(w.neighbours(b), {a, c})
         self.assertEqual(w.neighbours(c), {a, b})
 
+    def test_disconnect(self):
+        a = Point('')
+        b = Point('')
+        c = Point('')
+        d = Point('')
+
+        w = Wiring().connect(a, b).connect(b, c).connect(c, a).connect(c, d)
+        self.assertEqual(w.net(a), {a, b, c, d})
+
+        # Still connected through c
+        w.disconnect(a, b)
+        self.assertEqual(w.neighbours(a), {b, c, d})
+
+        w.disconnect(c, d)
+        self.assertEqual(w.neighbours(a), {b, c})
+        self.assertEqual(w.neighbours(d), set())
+        self.assertEqual(w.points(), {a, b, c, d})
+
+        w.disconnect(b, c)
+        self.assertEqual(w.neighbours(a), {c})
+        self.assertEqual(w.neighbours(b), set())
+        self.assertEqual(sorted(len(net) for net in w.nets()), [1, 1, 2])
+
+class CircuitTests(unittest.TestCase):
+    def test_netlist_cache(self):
+        a = Point('a')
+        b = Point('b')
+        ha = example.HalfAdder()
+        circuit = Circuit().add(ha).connect(a, ha.a)
+
+        netlist = circuit.netlist()
+        circuit.step()
+        self.assertIs(circuit.netlist(), netlist)
+        self.assertIn(ha._and.output, netlist.net_of)
+
+        circuit.connect(b, ha.b)
+        self.assertIsNot(circuit.netlist(), netlist)
+        netlist = circuit.netlist()
+
+        ha.wiring.disconnect(ha.b, ha._and.b)
+        self.assertIsNot(circuit.netlist(), netlist)
+
+    def test_half_adder(self):
+        a = Point('a')
+        b = Point('b')
+        ha = example.HalfAdder()
+        circuit = Circuit().add(ha).connect(a, ha.a).connect(b, ha.b)
+        for va, vb in itertools.product([LOW, HIGH], repeat=2):
+            a.OUT(value(va))
+            b.OUT(value(vb))
+            self.assertTrue(circuit.step()[0])
+            self.assertEqual(ha.s.get(), value(va ^ vb))
+            self.assertEqual(ha.c.get(), value(va & vb))
+
+    def test_changed(self):
+        a = Point('a').OUT(value_low())
+        b = Point('b').OUT(value_low())
+        ha = example.HalfAdder()
+        circuit = Circuit().add(ha).connect(a, ha.a).connect(b, ha.b)
+        circuit.step()
+        a.OUT(value_high())
+        circuit.step()
+        self.assertIn(ha.s, circuit.changed)
+        self.assertNotIn(ha.c, circuit.changed)
+        circuit.step()
+        self.assertEqual(circuit.changed, set())
+
+        with Journal() as journal:
+            b.OUT(value_high())
+            b.OUT(value_low())
+            a.OUT(value_low())
+        self.assertEqual(journal[a], value_high())
+        self.assertEqual(journal.changed(), [ a ])
+
+    def test_event_engine(self):
+        def make():
+            a = Point('a')
+            b = Point('b')
+            cin = Point('cin')
+            clock = SignalPoint('clock')
+            n_reset = SignalPoint('/reset').OUT(value_low())
+            fa = example.FullAdder()
+            counter = ic74.Counter_161(4)
+            high = SignalPoint('high').OUT(value_high())
+            circuit = (Circuit().add(fa).add(counter)
+                .connect(a, fa.a).connect(b, fa.b).connect(cin, fa.cin)
+                .connect(fa.cout, counter.cep).connect(high, counter.cet)
+                .connect(n_reset, counter.n_reset).connect(high, counter.n_ie)
+                .connect(clock, counter.clock)
+            )
+            circuit.step()
+            n_reset.OUT(value_high())
+            return circuit, (a, b, cin, clock), (fa.s, fa.cout, counter.output, counter.tc)
+
+        sweep, sweep_inputs, sweep_outputs = make()
+        event, event_inputs, event_outputs = make()
+        for va, vb, vc, vclock in itertools.product([LOW, HIGH], repeat=4):
+            for inputs in [ sweep_inputs, event_inputs ]:
+                for p, v in zip(inputs, [ va, vb, vc, vclock ]):
+                    p.OUT(value(v))
+            self.assertTrue(sweep.step(engine=SWEEP)[0])
+            self.assertTrue(event.step(engine=EVENT)[0])
+            self.assertEqual(signature(event_outputs), signature(sweep_outputs))
+
+    def test_oscillation(self):
+        for engine in [ SWEEP, EVENT, LEVELIZED ]:
+            high = SignalPoint('high').OUT(value_high())
+            ring = boolean.Xor('ring')
+            quiet = boolean.And('quiet')
+            # Known values to start from, or the ring settles undecided
+            ring.output.OUT(value_low())
+            ring.a.set(value_low())
+            ring.b.set(value_high())
+            circuit = (Circuit().add(ring).add(quiet)
+                .connect(high, ring.b).connect(ring.output, ring.a)
+                .connect(high, quiet.a).connect(high, quiet.b)
+            )
+            settled, n = circuit.step(engine=engine)
+            self.assertFalse(settled)
+            self.assertLess(n, 25)
+            oscillation = circuit.oscillation
+            self.assertEqual(oscillation.length, 2)
+            self.assertEqual(oscillation.components, { ring })
+            self.assertEqual([ set(net) for net in oscillation.nets ], [ { ring.a, ring.output } ])
+
+            circuit.disconnect(ring.output, ring.a)
+            self.assertTrue(circuit.step(engine=engine)[0])
+            self.assertIsNone(circuit.oscillation)
+
+    def test_checkpoint(self):
+        for engine in [ SWEEP, EVENT ]:
+            clock = SignalPoint('clock')
+            n_reset = SignalPoint('/reset').OUT(value_low())
+            high = SignalPoint('high').OUT(value_high())
+            low = SignalPoint('low').OUT(value_low())
+            counter = ic74.Counter_161(4)
+            ram = memory.RAM_62256(4, 4)
+            ram.n_ce.set(value_high())
+            circuit = (Circuit().add(counter).add(ram)
+                .connect(clock, counter.clock).connect(n_reset, counter.n_reset)
+                .connect(high, counter.n_ie).connect(high, counter.cep).connect(high, counter.cet)
+                .connect(counter.output, ram.address).connect(counter.output, ram.data)
+                .connect(low, ram.n_ce).connect(high, ram.n_oe).connect(clock, ram.n_we)
+            )
+            circuit.run(clock, 1, engine=engine)
+            n_reset.OUT(value_high())
+            circuit.run(clock, 5, engine=engine)
+            snapshot = circuit.checkpoint()
+
+            def continuation():
+                samples = circuit.run(clock, 20, probes={ 'count': counter.output }, engine=engine)[2]
+                return list(samples['count']), ram.dump()
+            first = continuation()
+            self.assertEqual(first[0][:3], [ 6, 7, 8 ])
+            self.assertEqual(list(first[1]), list(range(16)))
+            ram.load([ 0 ] * 16)
+            circuit.restore(snapshot)
+            self.assertEqual(counter.output.get(), int_to_value(5, 4))
+            self.assertEqual(list(ram.dump()), list(range(5)) + [ 0 ] * 11)
+            self.assertEqual(continuation(), first)
+
+            circuit.add(boolean.And())
+            self.assertRaises(AssertionError, circuit.restore, snapshot)
+
+        # Caches of the layout stay bounded
+        layout = checkpoint.Layout(circuit, circuit.netlist())
+        for n in range(checkpoint.CACHE_SIZE + 10):
+            codes = layout.encode(int_to_value(n, 16))[2:]
+            self.assertEqual(layout.decode(codes), int_to_value(n, 16))
+        self.assertLessEqual(len(layout._encoded), checkpoint.CACHE_SIZE)
+        self.assertLessEqual(len(layout._decoded), checkpoint.CACHE_SIZE)
+
+    def test_run(self):
+        for engine in [ SWEEP, EVENT ]:
+            clock = SignalPoint('clock')
+            n_reset = SignalPoint('/reset').OUT(value_low())
+            high = SignalPoint('high').OUT(value_high())
+            counter = ic74.Counter_161(4)
+            circuit = (Circuit().add(counter)
+                .connect(clock, counter.clock).connect(n_reset, counter.n_reset)
+                .connect(high, counter.n_ie).connect(high, counter.cep).connect(high, counter.cet)
+            )
+            self.assertEqual(circuit.run(clock, 1, engine=engine)[:2], (True, 1))
+            n_reset.OUT(value_high())
+            settled, n, samples = circuit.run(clock, 20, probes={ 'count': counter.output, 'tc': counter.tc }, engine=engine)
+            self.assertTrue(settled)
+            self.assertEqual(n, 20)
+            self.assertEqual(list(samples['count']), [ k % 16 for k in range(1, 21) ])
+            self.assertEqual(list(samples['tc']), [ int(k % 16 == 15) for k in range(1, 21) ])
+
+            until = lambda circuit, cycle: counter.output.get() == int_to_value(9, 4)
+            settled, n, samples = circuit.run(clock, 100, probes={ 'count': counter.output }, until=until, engine=engine)
+            self.assertEqual(n, 5)
+            self.assertEqual(list(samples['count']), [ 5, 6, 7, 8, 9 ])
+
+    def test_memoize(self):
+        width = 3
+        for engine in [ SWEEP, EVENT ]:
+            plain = ripple_adder(width)
+            memoized = ripple_adder(width)
+            circuit, a, b, cin, adders = memoized
+            for adder in adders:
+                circuit.memoize(adder, size=4)
+            self.assertEqual(len(circuit.netlist().active), width)
+
+            def check(vectors):
+                for bits in vectors:
+                    for circuit, a, b, cin, adders in [ plain, memoized ]:
+                        for point, x in zip(a + b + [ cin ], bits):
+                            point.OUT(value(x))
+                        self.assertTrue(circuit.step(engine=engine)[0])
+                    for x, y in zip(plain[4], memoized[4]):
+                        self.assertEqual(x.s.get(), y.s.get())
+                        self.assertEqual(x.cout.get(), y.cout.get())
+            vectors = list(itertools.product([ LOW, HIGH, FLOATING ], repeat=2 * width + 1))
+            check(vectors)
+            memo = adders[0].memo
+            self.assertGreater(memo.hits, 0)
+            self.assertEqual(len(memo.table), 4)
+            self.assertGreater(memo.evictions, 0)
+            self.assertIn('hits', repr(memo))
+
+            # Changes outside the subtree keep the cache, changes inside clear it
+            circuit.add(boolean.And())
+            check(vectors[:10])
+            self.assertEqual(memo.invalidations, 0)
+            half = adders[0]._ha1
+            half.wiring.disconnect(half.a, half._and.a)
+            half.wiring.connect(half.a, half._and.a)
+            check(vectors[:10])
+            self.assertEqual(memo.invalidations, 1)
+
+            # Forced nets inside are seen
+            for circuit, a, b, cin, adders in [ plain, memoized ]:
+                circuit.force(adders[1]._ha1.c, { 0: HIGH })
+            hits = memo.hits
+            check(vectors[:20])
+            self.assertEqual(memo.hits, hits)
+            for circuit, a, b, cin, adders in [ plain, memoized ]:
+                circuit.release()
+
+            circuit.unmemoize(adders[0])
+            # Two blocks, five gates of the first adder, and the And
+            self.assertEqual(len(circuit.netlist().active), 8)
+            check(vectors[:10])
+
+class DesignTests(unittest.TestCase):
+    def make(self):
+        circuit, a, b, cin, adders = ripple_adder(4)
+        circuit.memoize(adders[0])
+        rom = memory.ROM_28C256(8, 4).set_content([ 3 * n for n in range(16) ])
+        rom.n_oe.set(value_high())
+        ram = memory.RAM_62256(8, 4).load([ 5, 6, 7 ])
+        address = WidePoint('address', 4).OUT(int_to_packed(2, 4))
+        circuit.add(rom).add(ram).connect(address, rom.address).connect(address, ram.address)
+        return circuit
+
+    def test_round_trip(self):
+        circuit = self.make()
+        circuit.step()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'adder.design')
+            design.save(circuit, path)
+            loaded = design.load(path)
+            design.save(circuit, path, contents=False)
+            empty = design.load(path)
+
+        names = lambda netlist: [ sorted(p.name for p in net) for net in netlist.nets ]
+        self.assertEqual(names(loaded.netlist()), names(circuit.netlist()))
+        self.assertEqual(sorted(c.name for c in loaded.components()), sorted(c.name for c in circuit.components()))
+        self.assertEqual([ p.value for p in loaded.netlist().points ], [ p.value for p in circuit.netlist().points ])
+        rom, = [ c for c in loaded.components() if isinstance(c, memory.ROM_28C256) ]
+        ram, = [ c for c in loaded.components() if isinstance(c, memory.RAM_62256) ]
+        self.assertEqual(list(rom._content), [ 3 * n for n in range(16) ])
+        self.assertEqual(list(ram.dump()), [ 5, 6, 7 ] + [ 0 ] * 13)
+        self.assertEqual(ram.dirty_pages(), [ 0 ])
+        rom, = [ c for c in empty.components() if isinstance(c, memory.ROM_28C256) ]
+        self.assertEqual(list(rom._content), [ 0 ] * 16)
+
+        # Both simulate the same, and the loaded one can still be rewired
+        def inputs(circuit):
+            points = { p.name: p for p in circuit.netlist().points if p in circuit.netlist().external }
+            return [ points[name] for name in [ 'a', 'b', 'cin' ] ]
+        self.assertEqual(len(inputs(loaded)), 3)
+        for vector in itertools.product([ LOW, HIGH ], repeat=3):
+            for c in [ circuit, loaded ]:
+                for point, x in zip(inputs(c), vector):
+                    point.OUT(value(x))
+                self.assertTrue(c.step(engine=EVENT)[0])
+            self.assertEqual([ p.value for p in loaded.netlist().points ], [ p.value for p in circuit.netlist().points ])
+        memoized, = [ c for c in loaded.components() if c.memo is not None ]
+        self.assertGreater(memoized.memo.hits + memoized.memo.misses, 0)
+        loaded.add(boolean.Not())
+        self.assertEqual(len(loaded.netlist().nets), len(circuit.netlist().nets))
+        self.assertTrue(loaded.step()[0])
+
+class CacheTests(unittest.TestCase):
+    def test_artifacts(self):
+        with tempfile.TemporaryDirectory() as directory:
+            artifacts = cache.ArtifactCache(directory)
+            def run(circuit, a, b, cin, adders):
+                circuit.use_cache(artifacts)
+                for x in a + b + [ cin ]:
+                    x.OUT(value(HIGH))
+                self.assertTrue(circuit.step(engine=LEVELIZED)[0])
+                self.assertIsNotNone(circuit.netlist().artifacts[LEVELIZED])
+                return [ (adder.s.get(), adder.cout.get()) for adder in adders ]
+
+            first = run(*ripple_adder(3))
+            self.assertEqual((artifacts.hits, artifacts.misses), (0, 1))
+            self.assertEqual(run(*ripple_adder(3)), first)
+            self.assertEqual((artifacts.hits, artifacts.misses), (1, 1))
+
+            # Other structures, or other directions for the levelized code
+            run(*ripple_adder(2))
+            self.assertEqual(artifacts.misses, 2)
+            circuit, a, b, cin, adders = ripple_adder(3)
+            circuit.use_cache(artifacts)
+            self.assertTrue(circuit.step(engine=LEVELIZED)[0])
+            self.assertEqual(artifacts.misses, 3)
+
+            # Unreadable entries are dropped
+            for name in os.listdir(directory):
+                with open(os.path.join(directory, name), 'wb') as file:
+                    file.write(b'garbage')
+            self.assertEqual(run(*ripple_adder(3)), first)
+            self.assertEqual(artifacts.misses, 4)
+
+            # Netlists that cannot be levelized are cached as such
+            def shared():
+                a = Point('a').OUT(value_high())
+                both = boolean.And()
+                either = boolean.Or()
+                inverter = boolean.Not()
+                circuit = (Circuit().add(both).add(either).add(inverter).use_cache(artifacts)
+                    .connect(a, both.a).connect(a, both.b).connect(a, either.a).connect(a, either.b)
+                    .connect(both.output, inverter.a).connect(either.output, inverter.a)
+                )
+                circuit.step(engine=LEVELIZED)
+                self.assertIsNone(circuit.netlist().artifacts[LEVELIZED])
+                return inverter.a.get()
+            hits = artifacts.hits
+            self.assertEqual(shared(), value_conflict())
+            self.assertEqual(shared(), value_conflict())
+            self.assertEqual(artifacts.hits, hits + 1)
+
+            # Programs of other generators are not reused
+            fingerprint = cache.Fingerprint(ripple_adder(1)[0])
+            key = fingerprint.state_hash()
+            version = levelize.VERSION
+            try:
+                levelize.VERSION += 1
+                self.assertNotEqual(fingerprint.state_hash(), key)
+            finally:
+                levelize.VERSION = version
+
+            # Least recently used entries go first
+            artifacts.max_bytes = 0
+            artifacts.evict()
+            self.assertEqual(os.listdir(directory), [])
+
+    def test_sources(self):
+        fingerprint = cache.Fingerprint(ripple_adder(1)[0])
+        self.assertEqual(fingerprint.hash, cache.Fingerprint(ripple_adder(1)[0]).hash)
+        self.assertIn(boolean.__file__, cache.module_files({ boolean.And }))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'module.py')
+            with open(path, 'w') as file:
+                file.write('x = 1\n')
+            before = cache.source_hash(path)
+            with open(path, 'w') as file:
+                file.write('x = 12\n')
+            self.assertNotEqual(cache.source_hash(path), before)
+
+class FaultTests(unittest.TestCase):
+    def test_half_adder(self):
+        a = Point('a')
+        b = Point('b')
+        ha = example.HalfAdder()
+        circuit = Circuit().add(ha).connect(a, ha.a).connect(b, ha.b)
+        inputs = [ a, b ]
+        outputs = [ ha.s, ha.c ]
+        all_faults = faults.enumerate_faults(circuit)
+        self.assertEqual(len(all_faults), 2 * len(circuit.netlist().nets))
+
+        vectors = [ [ value(x), value(y) ] for x, y in itertools.product([LOW, HIGH], repeat=2) ]
+        report = faults.simulate(circuit, inputs, outputs, vectors, workers=0)
+        self.assertEqual(report.coverage, 1.0)
+
+        # Both inputs low: only the faults stuck at HIGH show
+        report = faults.simulate(circuit, inputs, outputs, vectors[:1], workers=0)
+        self.assertEqual({ f.symbol for f in report.detected }, { HIGH })
+        self.assertEqual(set(report.undetected()), { f for f in all_faults if f.symbol == LOW })
+        self.assertIn('stuck at 0', report.describe(report.undetected()[0]))
+
+        parallel = faults.simulate(circuit, inputs, outputs, vectors[:2], workers=2)
+        self.assertEqual(parallel.detected, faults.simulate(circuit, inputs, outputs, vectors[:2], workers=0).detected)
+        self.assertEqual(circuit.netlist().forced, {})
+
+        # Circuits with faults applied still copy
+        a.OUT(value_low())
+        b.OUT(value_low())
+        circuit.force(ha.s, { 0: HIGH })
+        copy = pickle.loads(pickle.dumps(circuit))
+        self.assertTrue(copy.step()[0])
+        copied = [ c for c in copy.components() if isinstance(c, example.HalfAdder) ][0]
+        self.assertEqual(copied.s.get(), value_high())
+        with tempfile.TemporaryDirectory() as directory:
+            design.save(circuit, os.path.join(directory, 'faulty.design'))
+
+class ProfilerTests(unittest.TestCase):
+    def test_half_adder(self):
+        a = Point('a')
+        b = Point('b')
+        ha = example.HalfAdder()
+        circuit = Circuit().add(ha).connect(a, ha.a).connect(b, ha.b)
+        with profile.Profiler(circuit) as profiler:
+            for va, vb in itertools.product([LOW, HIGH], repeat=2):
+                a.OUT(value(va))
+                b.OUT(value(vb))
+                circuit.step()
+        self.assertEqual(len(profiler.iterations), 4)
+        self.assertEqual(profiler.settled, 4)
+        self.assertEqual(profiler.calls[ha._xor], sum(profiler.iterations))
+        calls, times = profiler.by_class()
+        self.assertEqual(calls['And'], calls['Xor'])
+        net = circuit.netlist().nets[circuit.netlist().net_of[ha.s]]
+        self.assertEqual(profiler.resolutions[net], sum(profiler.iterations))
+        self.assertLess(profiler.changes[net], profiler.resolutions[net])
+        self.assertIn('Xor', profiler.report())
+
+        # Disabled again
+        self.assertNotIn('generate', vars(ha._xor))
+        circuit.step()
+        self.assertEqual(len(profiler.iterations), 4)
+
+    def test_per_circuit(self):
+        a = Point('a').OUT(value_low())
+        ha = example.HalfAdder()
+        circuit = Circuit().add(ha).connect(a, ha.a).connect(a, ha.b)
+        other = Circuit().add(example.HalfAdder())
+        with profile.Profiler(circuit) as profiler:
+            # Nets of other circuits are not counted
+            other.step()
+            self.assertEqual(len(profiler.resolutions), 0)
+            with self.assertRaises(AssertionError):
+                profile.Profiler(circuit).enable()
+            circuit.step(engine=EVENT)
+            self.assertEqual(set(profiler.resolutions), set(circuit.netlist().nets))
+        self.assertIsNone(circuit.netlist().resolve)
+
+class VCDTests(unittest.TestCase):
+    def test_counter(self):
+        clock = SignalPoint('clock')
+        n_reset = SignalPoint('/reset').OUT(value_low())
+        high = SignalPoint('high').OUT(value_high())
+        counter = ic74.Counter_161(4)
+        circuit = (Circuit().add(counter)
+            .connect(clock, counter.clock).connect(n_reset, counter.n_reset)
+            .connect(high, counter.n_ie).connect(high, counter.cep).connect(high, counter.cet)
+        )
+        out = io.StringIO()
+        with vcd.Tracer(circuit, out).trace(counter, clock) as tracer:
+            circuit.run(clock, 1)
+            n_reset.OUT(value_high())
+            circuit.run(clock, 2)
+            circuit.step()
+        lines = out.getvalue().splitlines()
+        self.assertIn('$var wire 4 " output $end', lines)
+        self.assertIn('$scope module Counter_161 $end', lines)
+        self.assertIn('bzzzz !', lines)
+        self.assertEqual(lines[lines.index('#3'):], [
+            '#3', 'b0001 "', '1$', '1)',
+            '#4', '0$', '0)',
+            '#5', 'b0010 "', '1$', '1)',
+        ])
+        self.assertNotIn(tracer, circuit.observers)
+
+    def test_values(self):
+        self.assertEqual(vcd.vcd_value(value_high(), '!'), '1!')
+        self.assertEqual(vcd.vcd_value(value(LOW, HI_Z, CONFLICT, FLOATING), '!'), 'b0zxz !')
+        self.assertEqual(vcd.vcd_value(int_to_packed(5, 4), '#'), 'b0101 #')
+        self.assertEqual(vcd.identifier(94), '!"')
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class TracesTests(unittest.TestCase):
+    def test_counter(self):
+        from simulator import traces
+        clock = SignalPoint('clock')
+        n_reset = SignalPoint('/reset').OUT(value_low())
+        high = SignalPoint('high').OUT(value_high())
+        counter = ic74.Counter_161(4)
+        circuit = (Circuit().add(counter)
+            .connect(clock, counter.clock).connect(n_reset, counter.n_reset)
+            .connect(high, counter.n_ie).connect(high, counter.cep).connect(high, counter.cet)
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            with traces.TraceWriter(circuit, directory, chunk=7).trace(counter.output, counter.tc):
+                circuit.run(clock, 1)
+                n_reset.OUT(value_high())
+                circuit.run(clock, 40)
+            t = traces.Traces(directory)
+            self.assertEqual(t.steps, 82)
+            self.assertEqual(t.names(), [ counter.output.name, counter.tc.name ])
+            # Step 0 is the low phase of the first cycle, step 2k + 1 the high phase of cycle k
+            self.assertEqual(t.first(counter.tc.name, 1), 31)
+            self.assertEqual(list(t.where(counter.tc.name, 1)), [ 31, 32, 63, 64 ])
+            self.assertEqual(t.value(counter.output.name, 7), int_to_value(3, 4))
+            counts = collections.Counter(((step - 1) // 2) % 16 for step in range(2, 82))
+            self.assertEqual(t.histogram(counter.output.name, 2), counts)
+            self.assertEqual(list(t.changes(counter.output.name, 0, 8)), [ 3, 5, 7 ])
+            self.assertEqual(t.first(counter.output.name, predicate=lambda v: v > 12), 27)
+            del t
+
+    def test_encode(self):
+        from simulator import traces
+        self.assertEqual(traces.encode(int_to_packed(5, 4)), (5, 0))
+        self.assertEqual(traces.encode(value(HIGH, HI_Z, HIGH)), (5, batch.C_HI_Z))
+        self.assertEqual(traces.column_type(9), 'H')
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class BatchTests(unittest.TestCase):
+    def test_full_adder(self):
+        a = Point('a')
+        b = Point('b')
+        cin = Point('cin')
+        fa = example.FullAdder()
+        circuit = Circuit().add(fa).connect(a, fa.a).connect(b, fa.b).connect(cin, fa.cin)
+
+        va, vb, vc = batch.exhaustive(1, 1, 1)
+        simulation = batch.Batch(circuit, len(va)).set(a, va).set(b, vb).set(cin, vc)
+        self.assertTrue(simulation.step()[0])
+        total = va + vb + vc
+        self.assertEqual(simulation.get_int(fa.s).tolist(), (total % 2).tolist())
+        self.assertEqual(simulation.get_int(fa.cout).tolist(), (total // 2).tolist())
+
+    def test_against_scalar(self):
+        def make():
+            clock = SignalPoint('clock').OUT(value_low())
+            reset = SignalPoint('reset').OUT(value_high())
+            controls = [ SignalPoint('control').OUT(value_high()) for n in range(3) ]
+            counter = ic74.Counter_193(3)
+            decoder = ic74.Decoder_139(3)
+            rom = memory.ROM_28C256(4, 3).set_content([ 7 * n % 16 for n in range(8) ])
+            rom.n_oe.set(value_high())
+            five = WidePoint('five', 3).OUT(int_to_value(5, 3))
+            bus = WidePoint('bus', 4)
+            circuit = (Circuit().add(counter).add(decoder).add(rom)
+                .connect(reset, counter.reset).connect(five, counter.input)
+                .connect(controls[0], counter.n_ie).connect(clock, counter.cpu).connect(controls[1], counter.cpd)
+                .connect(counter.output, decoder.input).connect(counter.output, rom.address)
+                .connect(controls[2], decoder.n_ie).connect(controls[2], rom.n_oe)
+                .connect(decoder.outputs[5], rom.n_ce).connect(rom.data, bus)
+            )
+            points = [ counter.output, counter.n_tcu, counter.n_tcd, bus ] + decoder.outputs
+            return circuit, clock, reset, controls, points
+
+        circuit, clock, reset, controls, batch_points = make()
+        stimuli = list(itertools.product([LOW, HIGH], repeat=3))
+        simulation = batch.Batch(circuit, len(stimuli))
+        simulation.step()
+        simulation.set(reset, [ LOW ] * len(stimuli))
+        for k, control in enumerate(controls):
+            simulation.set(control, [ stimulus[k] for stimulus in stimuli ])
+        for n in range(1, 12):
+            simulation.set(clock, [ n % 2 ] * len(stimuli))
+            simulation.step()
+
+        for row, stimulus in enumerate(stimuli):
+            circuit, clock, reset, controls, points = make()
+            circuit.step()
+            reset.OUT(value_low())
+            for control, x in zip(controls, stimulus):
+                control.OUT(value(x))
+            for n in range(1, 12):
+                clock.OUT(value(n % 2))
+                circuit.step()
+            for batch_point, point in zip(batch_points, points):
+                self.assertEqual(batch.from_codes(simulation.get(batch_point)[row]), point.get())
+
+    def test_rom_controls(self):
+        # Floating controls enable the ROM, as they do the scalar one
+        cases = list(itertools.product([ LOW, HIGH, FLOATING ], repeat=2))
+        n_ce = SignalPoint('/ce')
+        n_oe = SignalPoint('/oe')
+        address = WidePoint('address', 3).OUT(int_to_value(5, 3))
+        rom = memory.ROM_28C256(4, 3).set_content([ 7 * n % 16 for n in range(8) ])
+        circuit = Circuit().add(rom).connect(n_ce, rom.n_ce).connect(n_oe, rom.n_oe).connect(address, rom.address)
+        # Disabled until the address reaches the ROM
+        rom.n_ce.set(value_high())
+        circuit.step()
+        simulation = batch.Batch(circuit, len(cases))
+        simulation.set(n_ce, [ [ batch.CODES[ce] ] for ce, oe in cases ])
+        simulation.set(n_oe, [ [ batch.CODES[oe] ] for ce, oe in cases ])
+        simulation.step()
+        for k, (ce, oe) in enumerate(cases):
+            n_ce.OUT(value(ce))
+            n_oe.OUT(value(oe))
+            circuit.step()
+            self.assertEqual(batch.from_codes(simulation.get(rom.data)[k]), rom.data.get(), (ce, oe))
+
+        # New content is picked up
+        rom.set_content([ 15 - n for n in range(8) ])
+        simulation.step()
+        self.assertEqual(simulation.get_int(rom.data)[0], 10)
+
+def ripple_adder(width):
+    a = [ Point('a') for n in range(width) ]
+    b = [ Point('b') for n in range(width) ]
+    cin = Point('cin')
+    adders = [ example.FullAdder() for n in range(width) ]
+    circuit = Circuit()
+    carry = cin
+    for x, y, adder in zip(a, b, adders):
+        circuit.add(adder).connect(x, adder.a).connect(y, adder.b).connect(carry, adder.cin)
+        carry = adder.cout
+    return circuit, a, b, cin, adders
+
+class LevelizedTests(unittest.TestCase):
+    def test_ripple_adder(self):
+        width = 2
+        sweep = ripple_adder(width)
+        levelized = ripple_adder(width)
+        for bits in itertools.product([LOW, HIGH, FLOATING], repeat=2 * width + 1):
+            for circuit, a, b, cin, adders in [ sweep, levelized ]:
+                for point, x in zip(a + b + [ cin ], bits):
+                    if x == FLOATING:
+                        point.IN()
+                    else:
+                        point.OUT(value(x))
+            self.assertTrue(sweep[0].step(engine=SWEEP)[0])
+            self.assertTrue(levelized[0].step(engine=LEVELIZED)[0])
+            for x, y in zip(sweep[4], levelized[4]):
+                self.assertEqual(x.s.get(), y.s.get())
+                self.assertEqual(x.cout.get(), y.cout.get())
+        self.assertIsNotNone(levelized[0].netlist().artifacts[LEVELIZED])
+
+    def test_wide(self):
+        # Gate inputs are one bit wide until a bus drives them
+        a = WidePoint('a', 4)
+        b = WidePoint('b', 4)
+        xor = boolean.Xor()
+        inverter = boolean.Not()
+        circuit = (Circuit().add(xor).add(inverter)
+            .connect(a, xor.a).connect(b, xor.b).connect(xor.output, inverter.a)
+        )
+        for x, y in itertools.product(range(16), repeat=2):
+            a.OUT(int_to_value(x, 4))
+            b.OUT(int_to_value(y, 4))
+            circuit.step(engine=LEVELIZED)
+            self.assertEqual(xor.output.get(), int_to_value(x ^ y, 4))
+            self.assertEqual(inverter.output.get(), int_to_value(15 - (x ^ y), 4))
+            expected = inverter.output.get()
+            circuit.step(engine=SWEEP)
+            self.assertEqual(inverter.output.get(), expected)
+        self.assertIsNotNone(circuit.netlist().artifacts[LEVELIZED])
+
+    def test_fallback(self):
+        # Feedback loop
+        a = Point('a').OUT(value_high())
+        gate = boolean.Or()
+        circuit = Circuit().add(gate).connect(a, gate.a).connect(gate.output, gate.b)
+        self.assertTrue(circuit.step(engine=LEVELIZED)[0])
+        self.assertIsNone(circuit.netlist().artifacts[LEVELIZED])
+        self.assertEqual(gate.output.get(), value_undecided())
+
+        # Not only gates
+        b = Buffer()
+        circuit = Circuit().add(b).add(gate).connect(a, b.n_enable)
+        circuit.step(engine=LEVELIZED)
+        self.assertIsNone(circuit.netlist().artifacts[LEVELIZED])
+
+class PatternsTests(unittest.TestCase):
+    def test_ripple_adder(self):
+        width = 4
+        circuit, a, b, cin, adders = ripple_adder(width)
+        simulation = patterns.Patterns(circuit, 2**(2 * width + 1))
+        simulation.exhaustive(*reversed(a), *reversed(b), cin)
+        self.assertTrue(simulation.step()[0])
+        for k in range(2**(2 * width + 1)):
+            x = k >> (width + 1)
+            y = (k >> 1) % 2**width
+            total = x + y + k % 2
+            for n, adder in enumerate(adders):
+                self.assertEqual(simulation.value(adder.s, k), value((total >> n) % 2))
+            self.assertEqual(simulation.value(adders[-1].cout, k), value(total >> width))
+
+    def test_against_scalar(self):
+        symbols = [ LOW, HIGH, FLOATING, HI_Z, CONFLICT ]
+        for cls in [ boolean.And, boolean.Or, boolean.Xor ]:
+            a = Point('a')
+            b = Point('b')
+            gate = cls()
+            circuit = Circuit().add(gate).connect(a, gate.a).connect(b, gate.b)
+            simulation = patterns.Patterns(circuit, len(symbols)**2)
+            inputs = list(itertools.product(symbols, repeat=2))
+            simulation.assign(a, [ value(x) for x, y in inputs ])
+            simulation.assign(b, [ value(y) for x, y in inputs ])
+            simulation.step()
+            for k, (x, y) in enumerate(inputs):
+                a.OUT(value(x))
+                b.OUT(value(y))
+                circuit.step()
+                self.assertEqual(simulation.value(gate.output, k), gate.output.get())
+
+# Golden models for the verification harness
+def counter_161_model(case, width):
+    if case['n_reset'] == LOW:
+        return { 'output': 0, 'tc': 0 }
+    output = case['output']
+    triggered = case['clock'] == TriggerPoint.TRIGGERED
+    if case['n_ie'] == LOW:
+        if triggered:
+            output = case['input']
+    elif case['cep'] == HIGH and case['cet'] == HIGH and triggered:
+        output = (output + 1) % 2**width
+    tc = case['cet'] if output == 2**width - 1 else LOW
+    return { 'output': output, 'tc': tc }
+
+def decoder_139_model(case, width):
+    if case['n_ie'] == HIGH:
+        return { 'outputs': [ HIGH ] * 2**width }
+    return { 'outputs': [ LOW if n == case['input'] else HIGH for n in range(2**width) ] }
+
+class VerifyTests(unittest.TestCase):
+    def test_counter_161(self):
+        axes = {
+            'input': [ 0x5A ], 'output': verify.WORDS, 'n_reset': verify.SIGNALS, 'n_ie': verify.SIGNALS,
+            'cep': verify.SIGNALS, 'cet': verify.SIGNALS, 'clock': verify.CLOCKS,
+        }
+        factory = functools.partial(ic74.Counter_161, 8)
+        model = functools.partial(counter_161_model, width=8)
+        result = verify.verify(factory, model, axes, workers=2)
+        self.assertEqual(result.cases, 256 * 16 * 3)
+        self.assertTrue(result.ok, result.describe())
+
+        # Counting down instead
+        def wrong(case):
+            expected = model(case)
+            if case['n_reset'] == HIGH and case['n_ie'] == HIGH and case['clock'] == TriggerPoint.TRIGGERED:
+                expected['output'] = (case['output'] - 1) % 256 if case['cep'] == HIGH and case['cet'] == HIGH else case['output']
+            return expected
+        result = verify.verify(factory, wrong, axes, workers=0, limit=3)
+        self.assertEqual(len(result.mismatches), 3)
+        everything = verify.verify(factory, wrong, axes, workers=0, limit=None)
+        self.assertEqual(len(everything.mismatches), 256)
+        self.assertEqual(everything.mismatches[:3], result.mismatches)
+        number, name, expected, actual = result.mismatches[0]
+        self.assertEqual(name, 'Counter_161.output')
+        self.assertEqual(result.harness.case(number)['clock'], TriggerPoint.TRIGGERED)
+        self.assertIn('expected', result.describe())
+
+    def test_decoder_139(self):
+        factory = functools.partial(ic74.Decoder_139, 4)
+        model = functools.partial(decoder_139_model, width=4)
+        result = verify.verify(factory, model, { 'input': verify.WORDS, 'n_ie': verify.SIGNALS }, workers=0, chunk=5)
+        self.assertTrue(result.ok, result.describe())
+
+class TestbenchTests(unittest.TestCase):
+    def make(self):
+        clock = SignalPoint('clock').OUT(value_low())
+        reset = SignalPoint('reset').OUT(value_high())
+        n_ie = SignalPoint('/ie').OUT(value_high())
+        high = SignalPoint('high').OUT(value_high())
+        counter = ic74.Counter_193(4)
+        circuit = (Circuit().add(counter)
+            .connect(clock, counter.cpu).connect(high, counter.cpd)
+            .connect(reset, counter.reset).connect(n_ie, counter.n_ie)
+        )
+        return circuit, clock, reset, counter
+
+    def test_concurrent(self):
+        circuit, clock, reset, counter = self.make()
+        bench = testbench.Testbench(circuit, clock)
+        seen = []
+
+        async def monitor():
+            while True:
+                await testbench.falling_edge(counter.n_tcu)
+                seen.append(bench.cycle)
+
+        async def main():
+            testbench.start(monitor())
+            await testbench.cycles(2)
+            reset.OUT(value_low())
+            await testbench.value_equals(counter.output, 9)
+            self.assertEqual(bench.cycle, 11)
+            await testbench.rising_edge(counter.n_tcu)
+            self.assertEqual(counter.output.get(), value_low(4))
+            await testbench.falling_edge(counter.n_tcu)
+            return bench.cycle
+
+        self.assertEqual(bench.run(main()), 33)
+        self.assertEqual(seen, [ 17, 33 ])
+        # Settled once per clock phase, nothing more
+        self.assertEqual(bench.steps, 2 * 33 + 1)
+
+    def test_first_and_join(self):
+        circuit, clock, reset, counter = self.make()
+        bench = testbench.Testbench(circuit, clock)
+
+        async def wait(n):
+            return await testbench.first(testbench.value_equals(counter.output, n), testbench.cycles(8))
+
+        async def main():
+            await testbench.cycles(1)
+            reset.OUT(value_low())
+            task = testbench.start(wait(3))
+            await testbench.join(task)
+            self.assertIsInstance(task.result(), testbench.ValueEquals)
+            self.assertIsInstance(await wait(2), testbench.Cycles)
+
+        bench.run(main())
+
+        # Waiting for what never comes, without a clock or for too long
+        async def stuck():
+            await testbench.changed(counter.output)
+        async def never():
+            await testbench.falling_edge(reset)
+        with self.assertRaises(RuntimeError):
+            testbench.Testbench(circuit).run(stuck())
+        with self.assertRaises(TimeoutError):
+            testbench.Testbench(circuit, clock).run(never(), cycles=4)
+
 class Test_Buffer(unittest.TestCase):
     def test_forward_bit(self):
         b = Buffer()
@@ -120,6 +1021,113 @@ class Test_And(unittest.TestCase):
             e.generate()
             self.assertEqual(e.output.get(), value(r0, r1))
 
+class Test_Gates(unittest.TestCase):
+    def gates(self):
+        yield boolean.Not(), lambda bits: not bits[0]
+        functions = {
+            boolean.And: all, boolean.Or: any, boolean.Xor: lambda bits: sum(bits) % 2,
+            boolean.Nand: lambda bits: not all(bits), boolean.Nor: lambda bits: not any(bits),
+            boolean.Xnor: lambda bits: not sum(bits) % 2,
+        }
+        for cls, function in functions.items():
+            for inputs in (2, 3):
+                yield cls(inputs=inputs), function
+
+    def test_bits_and_words(self):
+        for gate, function in self.gates():
+            n = len(gate.inputs)
+            for bits in itertools.product([LOW, HIGH], repeat=2 * n):
+                values = [ value(*bits[2 * i:2 * i + 2]) for i in range(n) ]
+                expected = value(*( int(function(column)) for column in zip(*values) ))
+                for convert in (list, pack):
+                    for p, x in zip(gate.inputs, values):
+                        p.set(convert(x))
+                    gate.generate()
+                    self.assertEqual(list(gate.output.get()), expected)
+            gate.inputs[-1].set(value(LOW, HI_Z))
+            gate.generate()
+            self.assertEqual(gate.output.get()[1], UNDECIDED)
+            gate.inputs[-1].set(pack(value(LOW, HI_Z)))
+            gate.generate()
+            self.assertEqual(gate.output.get()[1], UNDECIDED)
+
+    def test_engines(self):
+        symbols = [ LOW, HIGH, FLOATING, CONFLICT ]
+        for gate, function in self.gates():
+            inputs = [ Point('input') for p in gate.inputs ]
+            circuit = Circuit().add(gate)
+            for x, p in zip(inputs, gate.inputs):
+                circuit.connect(x, p)
+            vectors = list(itertools.product(symbols, repeat=len(inputs)))
+            simulation = patterns.Patterns(circuit, len(vectors))
+            for n, x in enumerate(inputs):
+                simulation.assign(x, [ value(vector[n]) for vector in vectors ])
+            simulation.step()
+            if numpy is not None:
+                codes = batch.Batch(circuit, len(vectors))
+                for n, x in enumerate(inputs):
+                    codes.set(x, [ [ batch.CODES[vector[n]] ] for vector in vectors ])
+                codes.step()
+            for k, vector in enumerate(vectors):
+                for x, symbol in zip(inputs, vector):
+                    x.OUT(value(symbol))
+                circuit.step(engine=LEVELIZED)
+                expected = gate.output.get()
+                circuit.step(engine=SWEEP)
+                self.assertEqual(gate.output.get(), expected)
+                self.assertEqual(simulation.value(gate.output, k), expected)
+                if numpy is not None:
+                    self.assertEqual(batch.from_codes(codes.get(gate.output)[k]), expected)
+            self.assertIsNotNone(circuit.netlist().artifacts[LEVELIZED])
+
+    def test_wide_engines(self):
+        # Every engine on its own circuit, from the same vectors
+        for width in (4, 8):
+            for gate, function in self.gates():
+                n = len(gate.inputs)
+                gates = [ gate ] + [ type(gate)() if n == 1 else type(gate)(inputs=n) for k in range(2) ]
+                engines = []
+                for engine, g in zip((SWEEP, EVENT, LEVELIZED), gates):
+                    inputs = [ WidePoint('input', width) for p in g.inputs ]
+                    circuit = Circuit().add(g)
+                    for x, p in zip(inputs, g.inputs):
+                        circuit.connect(x, p)
+                    engines.append((engine, circuit, inputs, g))
+                for k in range(40):
+                    words = [ (37 * k + 91 * i + 5) % 2**width for i in range(n) ]
+                    columns = zip(*( int_to_value(word, width) for word in words ))
+                    expected = value(*( int(function(column)) for column in columns ))
+                    for engine, circuit, inputs, g in engines:
+                        for x, word in zip(inputs, words):
+                            x.OUT(int_to_value(word, width))
+                        self.assertTrue(circuit.step(engine=engine)[0])
+                        self.assertEqual(g.output.get(), expected, (g, engine, words))
+                self.assertIsNotNone(engines[-1][1].netlist().artifacts[LEVELIZED])
+
+    def test_shared_net(self):
+        # Two gates driving one net, read by a third
+        results = {}
+        for engine in (SWEEP, EVENT, LEVELIZED):
+            a = Point('a')
+            b = Point('b')
+            both = boolean.And()
+            either = boolean.Or()
+            inverter = boolean.Not()
+            circuit = (Circuit().add(both).add(either).add(inverter)
+                .connect(a, both.a).connect(b, both.b).connect(a, either.a).connect(b, either.b)
+                .connect(both.output, inverter.a).connect(either.output, inverter.a)
+            )
+            results[engine] = []
+            for x, y in itertools.product([ LOW, HIGH ], repeat=2):
+                a.OUT(value(x))
+                b.OUT(value(y))
+                circuit.step(engine=engine)
+                results[engine].append((inverter.a.get(), inverter.output.get()))
+        self.assertEqual(results[LEVELIZED], results[SWEEP])
+        self.assertEqual(results[EVENT], results[SWEEP])
+        self.assertEqual(results[SWEEP][0], (value_conflict(), value_undecided()))
+        self.assertIsNone(circuit.netlist().artifacts[LEVELIZED])
+
 class Test_Register_173(unittest.TestCase):
     def test_full_173(self):
         def make(input, n_ie, n_oe, reset, clock):
@@ -533,6 +1541,115 @@ class Test_ROM_28C256(unittest.TestCase):
         too_big[0] = 16
         self.assertRaises(AssertionError, rom.set_content, too_big)
 
+    def test_images(self):
+        def read(rom, address):
+            rom.address.set(int_to_packed(address, rom.address_width))
+            rom.generate()
+            return value_to_int(rom.data.get())
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'image.bin')
+            with open(path, 'wb') as file:
+                file.write(bytes(range(255, -1, -1)))
+            image = memory.load_binary(path, 8)
+            roms = [ memory.ROM_28C256(8, 8).set_content(image) for n in range(2) ]
+            for rom in roms:
+                rom.n_ce.set(value_low())
+                rom.n_oe.set(value_low())
+            self.assertIs(roms[0]._content, roms[1]._content)
+            self.assertEqual([ read(roms[1], n) for n in (0, 1, 255) ], [ 255, 254, 0 ])
+            self.assertIsInstance(roms[1].data.get(), Packed)
+
+            # Words in native byte order
+            wide = memory.ROM_28C256(16, 7).load_binary(path)
+            wide.n_ce.set(value_low())
+            wide.n_oe.set(value_low())
+            self.assertEqual(read(wide, 0), int.from_bytes(bytes([ 255, 254 ]), sys.byteorder))
+            self.assertRaises(AssertionError, memory.ROM_28C256(16, 6).load_binary, path)
+            self.assertRaises(AssertionError, memory.ROM_28C256(12, 7).load_binary, path)
+
+            path = os.path.join(directory, 'image.hex')
+            with open(path, 'w') as file:
+                file.write(':0300300002337A1E\n:020000040000FA\n:00000001FF\n')
+            rom = memory.ROM_28C256(8, 8).load_hex(path)
+            rom.n_ce.set(value_low())
+            rom.n_oe.set(value_low())
+            self.assertEqual([ read(rom, n) for n in (0x2F, 0x30, 0x31, 0x32) ], [ 0xFF, 0x02, 0x33, 0x7A ])
+            with open(path, 'w') as file:
+                file.write(':0300300002337A1F\n')
+            self.assertRaises(ValueError, memory.load_hex, path, 256)
+
+class Test_RAM_62256(unittest.TestCase):
+    def test_read_write(self):
+        ram = memory.RAM_62256(8, 16)
+        address = WidePoint('address', 16).OUT(int_to_packed(0x1234, 16))
+        data = WidePoint('data', 8).OUT(int_to_packed(0x5A, 8))
+        n_ce = SignalPoint('/ce').OUT(value_low())
+        n_oe = SignalPoint('/oe').OUT(value_high())
+        n_we = SignalPoint('/we').OUT(value_low())
+        ram.n_ce.set(value_high())
+        circuit = (Circuit().add(ram)
+            .connect(address, ram.address).connect(data, ram.data)
+            .connect(n_ce, ram.n_ce).connect(n_oe, ram.n_oe).connect(n_we, ram.n_we)
+        )
+        self.assertTrue(circuit.step()[0])
+        self.assertEqual(ram[0x1234], 0x5A)
+        self.assertEqual(ram.dirty_pages(), [ 0x12 ])
+
+        n_we.OUT(value_high())
+        n_oe.OUT(value_low())
+        data.IN()
+        self.assertTrue(circuit.step()[0])
+        self.assertEqual(data.get(), int_to_value(0x5A, 8))
+
+        # Writes right after a read store the bus, never the word read
+        for engine in (SWEEP, EVENT):
+            for target, word, dirty in [ (0x2000, 0, []), (0x3000, 0x5A, [ 0x30 ]) ]:
+                ram.clear_dirty()
+                address.OUT(int_to_packed(target, 16))
+                n_oe.OUT(value_high())
+                n_we.OUT(value_low())
+                data.OUT(int_to_packed(word, 8))
+                self.assertTrue(circuit.step(engine=engine)[0])
+                n_we.OUT(value_high())
+                self.assertTrue(circuit.step(engine=engine)[0])
+                self.assertEqual(ram[target], word)
+                self.assertEqual(ram.dirty_pages(), dirty)
+                # Read back
+                address.OUT(int_to_packed(0x1234, 16))
+                n_oe.OUT(value_low())
+                data.IN()
+                self.assertTrue(circuit.step(engine=engine)[0])
+                self.assertEqual(data.get(), int_to_value(0x5A, 8))
+                ram[target] = 0
+
+        n_ce.OUT(value_high())
+        self.assertTrue(circuit.step()[0])
+        self.assertEqual(ram.data.get(), value_hi_z(8))
+
+    def test_load_dump(self):
+        ram = memory.RAM_62256(16, 12)
+        ram.load([ 1, 2, 0xFFFF ], 510)
+        self.assertEqual(ram.dirty_pages(), [ 1, 2 ])
+        self.assertEqual(ram.dump(None, 510, 513), array.array('H', [ 1, 2, 0xFFFF ]).tobytes())
+        self.assertEqual(list(ram.dirty_content()), [ 1, 2 ])
+        self.assertEqual(len(ram.dirty_content()[1]), 2 * memory.PAGE)
+
+        ram.clear_dirty()
+        ram.load([])
+        ram.load(b'', 700)
+        self.assertEqual(ram.dirty_pages(), [])
+        ram.load(array.array('H', [ 7 ] * 4).tobytes())
+        ram[3] = 7
+        self.assertEqual(ram.dirty_pages(), [ 0 ])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'ram.bin')
+            ram.dump(path)
+            copy = memory.RAM_62256(16, 12).load(path)
+        self.assertEqual(copy.dump(), ram.dump())
+        self.assertRaises(AssertionError, ram.load, [ 1 ], 4096)
+        self.assertRaises(AssertionError, memory.RAM_62256(12, 4).load, [ 4096 ])
+
 if __name__ == "__main__":
     unittest.main()
 